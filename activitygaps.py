@@ -0,0 +1,69 @@
+from typing import Optional
+
+import numpy as np
+
+from instrumentation import metrics, timed
+from schedule import SECONDS_PER_DAY, DailySchedule
+
+# windows run from this local hour to the same hour the next day, so a night (and any activity past midnight)
+# falls inside a single window
+DEFAULT_ANCHOR_HOUR = 18
+# same bounds calculate_sleep_schedule uses for a plausible night
+DEFAULT_MIN_GAP_HOURS = 6
+DEFAULT_MAX_GAP_HOURS = 16
+
+
+class ActivityTimeline:
+    # every activity event from any number of sources as two arrays sorted by time: epoch seconds and the utc
+    # offset in effect at each event
+    __slots__ = ('times', 'offsets')
+
+    def __init__(self, times: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        times = np.empty(0, dtype=np.int64) if times is None else np.asarray(times, dtype=np.int64)
+        offsets = np.zeros(len(times), dtype=np.int32) if offsets is None else np.asarray(offsets, dtype=np.int32)
+        order = np.argsort(times, kind='stable')
+        self.times = times[order]
+        self.offsets = offsets[order]
+
+    @classmethod
+    def combine(cls, *sources) -> "ActivityTimeline":
+        # sources are ActivityTimelines or (times, offsets) pairs
+        pairs = [(source.times, source.offsets) if isinstance(source, ActivityTimeline) else source
+                 for source in sources]
+        if not pairs:
+            return cls()
+        return cls(np.concatenate([times for times, _ in pairs]), np.concatenate([offsets for _, offsets in pairs]))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __repr__(self) -> str:
+        return f"ActivityTimeline({len(self)} events)"
+
+    @timed('gaps.detect')
+    def sleep_schedule(self, anchor_hour: float = DEFAULT_ANCHOR_HOUR, min_gap_hours: float = DEFAULT_MIN_GAP_HOURS,
+                       max_gap_hours: float = DEFAULT_MAX_GAP_HOURS) -> DailySchedule:
+        # the longest inactivity gap of each window, as (start = last event before it, end = first event after
+        # it), dated by the local date the window starts on; windows whose longest gap is outside
+        # [min_gap_hours, max_gap_hours] (no sleep, or missing data) are left out
+        if len(self) < 2:
+            return DailySchedule()
+        gaps = np.diff(self.times)
+        onsets = self.times[:-1] + self.offsets[:-1]
+        windows = (onsets - int(anchor_hour * 3600)) // SECONDS_PER_DAY
+
+        # sorted by window, then gap length, the last entry of each window is its longest gap
+        order = np.lexsort((gaps, windows))
+        sorted_windows = windows[order]
+        longest = order[np.flatnonzero(np.append(sorted_windows[1:] != sorted_windows[:-1], True))]
+        longest = longest[(gaps[longest] >= min_gap_hours * 3600) & (gaps[longest] <= max_gap_hours * 3600)]
+        metrics.count('gaps.events', len(self))
+        metrics.count('gaps.nights', len(longest))
+
+        return DailySchedule.from_arrays(
+            windows[longest].astype('datetime64[D]'),
+            self.times[longest],
+            self.times[longest + 1],
+            self.offsets[longest],
+            self.offsets[longest + 1],
+        )
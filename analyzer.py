@@ -1,130 +1,131 @@
-import sys
+import argparse
+import os
+import time as timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from applehealthanalyzer import AppleHealthAnalyzer
-from browserhistoryanalyzer import BrowserHistoryAnalyzer
+from browserhistoryanalyzer import DEFAULT_TIMEZONE, IJSON_BACKEND, BrowserHistoryAnalyzer
 from youtubehistoryanalyzer import YoutubeHistoryAnalyzer
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
-from datetime import datetime, time
+from schedule import DailySchedule
+from activitygaps import DEFAULT_ANCHOR_HOUR, ActivityTimeline
+from sourcecache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, SourceCache
+from incremental import DEFAULT_STORE_DIR, ScheduleStore, ingest
+from instrumentation import Profiler, dump_metrics, metrics, timed
+from tzoffsets import read_travel_schedule
+from export import ARROW_COMPRESSIONS, DEFAULT_COMPRESSION, EXPORT_FORMATS, export, require_pyarrow
+from resampling import DEFAULT_CONFIDENCE, DEFAULT_RESAMPLES, DEFAULT_SEED, bootstrap_ci, paired_permutation_test
 import numpy as np
-from scipy.stats import ttest_ind
-def parse_timestamps(data):
-    parsed_data = {}
-    for date, (wake, sleep) in data.items():
-        wake_time = datetime.strptime(wake, "%I:%M %p").time()
-        sleep_time = datetime.strptime(sleep, "%I:%M %p").time()
-        if sleep_time < wake_time:
-            sleep_time = (sleep_time.hour + 24, sleep_time.minute)
-        else:
-            sleep_time = (sleep_time.hour, sleep_time.minute)
-        sleep_time = time(sleep_time[0] % 24, sleep_time[1])
-
-        parsed_data[date] = (wake_time, sleep_time)
-    return parsed_data
-
-def align_datasets(yt_data, google_data, apple_data):
-    all_dates = set(yt_data.keys()) | set(google_data.keys()) | set(apple_data.keys())
-    aligned_data = {date: (None, None) for date in all_dates}
-
-    for date in all_dates:
-        yt_entry = yt_data.get(date, (None, None))
-        google_entry = google_data.get(date, (None, None))
-        apple_entry = apple_data.get(date, (None, None))
-
-        aligned_data[date] = {
-            'youtube': yt_entry,
-            'chrome': google_entry,
-            'apple': apple_entry
-        }
 
+# pandas, matplotlib and seaborn are imported inside the functions that use them so that startup
+# (and runs that skip plotting) don't pay seconds of import time for them
+PLOT_MODES = ('show', 'save', 'none')
+SOURCES = ('youtube', 'chrome', 'apple')
+
+@timed('analysis.align')
+def align_datasets(yt_data, google_data, apple_data, **extra):
+    # one date-indexed frame with <source>_start / <source>_end columns in local hours of day; NaN where a
+    # source has no entry for that date. `extra` schedules get columns under their keyword
+    import pandas as pd
+
+    columns = {}
+    for source, schedule in [*zip(SOURCES, (yt_data, google_data, apple_data)), *extra.items()]:
+        index = pd.DatetimeIndex(schedule.dates)
+        columns[f'{source}_start'] = pd.Series(schedule.start_hours(), index=index)
+        columns[f'{source}_end'] = pd.Series(schedule.end_hours(), index=index)
+
+    aligned_data = pd.DataFrame(columns).sort_index()
+    aligned_data.index.name = 'date'
     return aligned_data
 
+@timed('analysis.average_schedule')
 def estimate_average_sleep_schedule(data, mode="apple"):
-    total_start = 0
-    total_end = 0
-    count = 0
-
-    for date, entry in data.items():
-        start, end = entry[mode]
-        if start is not None and end is not None:
-            start_hour = start.hour + start.minute / 60
-            end_hour = end.hour + end.minute / 60
-            if end_hour < start_hour:
-                end_hour += 24
-
-            total_start += start_hour
-            total_end += end_hour
-            count += 1
-
-    if count == 0:
+    entries = data[[f'{mode}_start', f'{mode}_end']].dropna()
+    if entries.empty:
         return None, None
 
-    avg_start = total_start / count
-    avg_end = total_end / count
-
-    return avg_start, avg_end
-
-def calculate_accuracy(aligned_data, avg_sleep_schedule):
-    accuracy = {'youtube': [], 'chrome': []}
-
-    for date, entry in aligned_data.items():
-        apple_start, apple_end = entry['apple']
-        if apple_start is None or apple_end is None:
-            continue
-
-        for source in ['youtube', 'chrome']:
-            source_start, source_end = entry[source]
-            if source_start is None or source_end is None:
-                continue
-            apple_start_hour = apple_start.hour + apple_start.minute / 60
-            apple_end_hour = apple_end.hour + apple_end.minute / 60
+    start_hour = entries[f'{mode}_start']
+    end_hour = entries[f'{mode}_end']
+    end_hour = end_hour.where(end_hour >= start_hour, end_hour + 24)
 
-            source_start_hour = source_start.hour + source_start.minute / 60
-            source_end_hour = source_end.hour + source_end.minute / 60
+    return float(start_hour.mean()), float(end_hour.mean())
 
-            apple_start_diff = abs(apple_start_hour - avg_sleep_schedule[0])
-            apple_end_diff = abs(apple_end_hour - avg_sleep_schedule[1])
-
-            source_start_diff = abs(source_start_hour - avg_sleep_schedule[0])
-            source_end_diff = abs(source_end_hour - avg_sleep_schedule[1])
-
-            accuracy_diff = (apple_start_diff + apple_end_diff) - (source_start_diff + source_end_diff)
-            accuracy[source].append(accuracy_diff)
-
-    return accuracy
+def _schedule_diff(aligned_data, source, avg_sleep_schedule):
+    return ((aligned_data[f'{source}_start'] - avg_sleep_schedule[0]).abs()
+            + (aligned_data[f'{source}_end'] - avg_sleep_schedule[1]).abs())
 
+@timed('analysis.accuracy')
+def calculate_accuracy(aligned_data, avg_sleep_schedule):
+    # per-date accuracy difference for each source, only on dates where both it and apple have an entry; empty
+    # when apple had nothing to average (it failed to load or has no sleep data)
+    import pandas as pd
+
+    if avg_sleep_schedule[0] is None:
+        return {source: pd.Series(dtype=float, index=pd.DatetimeIndex([], name='date'))
+                for source in ['youtube', 'chrome']}
+    apple_diff = _schedule_diff(aligned_data, 'apple', avg_sleep_schedule)
+    return {source: (apple_diff - _schedule_diff(aligned_data, source, avg_sleep_schedule)).dropna()
+            for source in ['youtube', 'chrome']}
+
+@timed('analysis.statistics')
 def calculate_statistics(accuracy):
+    # NaN statistics for a source without any dates in common with apple
     stats = {}
     for source, diffs in accuracy.items():
+        diffs = np.asarray(diffs, dtype=float)
+        if not len(diffs):
+            stats[source] = {name: np.nan for name in ('mean', 'std', 'min', 'max')}
+            continue
         stats[source] = {
-            'mean': np.mean(diffs),
-            'std': np.std(diffs),
-            'min': np.min(diffs),
-            'max': np.max(diffs)
+            'mean': diffs.mean(),
+            'std': diffs.std(),
+            'min': diffs.min(),
+            'max': diffs.max()
         }
     return stats
 
-def plot_start_end_times(aligned_data):
-    dates = []
-    start_times = {'youtube': [], 'chrome': [], 'apple': []}
-    end_times = {'youtube': [], 'chrome': [], 'apple': []}
-
-    for date, entry in aligned_data.items():
-        dates.append(date)
-        for source in ['youtube', 'chrome', 'apple']:
-            start, end = entry[source]
-            if start is not None:
-                start_times[source].append(start.hour + start.minute / 60)
-            else:
-                start_times[source].append(None)
-            if end is not None:
-                end_times[source].append(end.hour + end.minute / 60)
-            else:
-                end_times[source].append(None)
-
-    df_start = pd.DataFrame(start_times, index=dates)
-    df_end = pd.DataFrame(end_times, index=dates)
+def resample_accuracy(accuracy, resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED):
+    # bootstrap interval of each source's mean accuracy diff, and a paired permutation test of youtube against
+    # chrome on the dates both have
+    youtube_diffs, chrome_diffs = accuracy['youtube'].align(accuracy['chrome'], join='inner')
+    return {
+        'intervals': {source: bootstrap_ci(diffs, resamples=resamples, confidence=confidence, seed=seed)
+                      for source, diffs in accuracy.items()},
+        'paired': dict(paired_permutation_test(youtube_diffs, chrome_diffs, resamples, seed), days=len(youtube_diffs)),
+    }
+
+def _pyplot(plots):
+    import matplotlib
+    if plots != 'show':
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _finish_figure(plt, fig, name, plots, plot_dir, plot_format):
+    if plots == 'show':
+        plt.show()
+        return
+    os.makedirs(plot_dir, exist_ok=True)
+    fig.savefig(os.path.join(plot_dir, f"{name}.{plot_format}"))
+    plt.close(fig)
+
+@timed('plot.accuracy')
+def plot_accuracy(accuracy, plots='show', plot_dir='.', plot_format='png'):
+    plt = _pyplot(plots)
+    import seaborn as sns
+
+    fig = plt.figure(figsize=(10, 6))
+    sns.boxplot(data=[accuracy['youtube'].to_numpy(), accuracy['chrome'].to_numpy()], palette='viridis')
+    plt.xticks(ticks=[0, 1], labels=['YouTube', 'Chrome'])
+    plt.title('Accuracy Comparison of Sleep Schedule Estimation')
+    plt.ylabel('Accuracy Difference (Lower is Better)')
+    plt.xlabel('Data Source')
+    _finish_figure(plt, fig, 'accuracy', plots, plot_dir, plot_format)
+
+@timed('plot.start_end_times')
+def plot_start_end_times(aligned_data, plots='show', plot_dir='.', plot_format='png'):
+    plt = _pyplot(plots)
+    df_start = aligned_data[[f'{source}_start' for source in SOURCES]].set_axis(SOURCES, axis=1)
+    df_end = aligned_data[[f'{source}_end' for source in SOURCES]].set_axis(SOURCES, axis=1)
 
     fig, ax = plt.subplots(2, 1, figsize=(14, 12), sharex=True)
 
@@ -141,31 +142,221 @@ def plot_start_end_times(aligned_data):
     plt.xlabel('Date')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
-def main():
-    args = sys.argv
-    if len(args) < 4:
-        print("usage: [filepath for youtube data (html)] [filepath for Chrome data (json)] [filepath for Apple Health data (xml)]")
-    yt_path = args[1]
-    google_path = args[2]
-    apple_path = args[3]
-    yt = YoutubeHistoryAnalyzer(yt_path)
-    google = BrowserHistoryAnalyzer(google_path)
-    apple = AppleHealthAnalyzer(apple_path)
-    print("loading data: Youtube")
-
-    yt_data = yt.analyze()
-    print("loading data: Google")
-    google_data = google.process_daily_timestamps()
-    print("loading data: Apple")
-    apple_data = apple.analyze()
-
-    print(apple_data)
-    yt_data_parsed = parse_timestamps(yt_data)
-    google_data_parsed = parse_timestamps(google_data)
-    apple_data_parsed = parse_timestamps(apple_data)
-
-    aligned_data = align_datasets(yt_data_parsed, google_data_parsed, apple_data_parsed)
+    _finish_figure(plt, fig, 'start_end_times', plots, plot_dir, plot_format)
+# with a store, each loader only analyzes what is newer than the source's high-water mark and returns the
+# stored schedule merged with it. With a timezone (a zone name or an OffsetTable) every source is placed in it;
+# without one youtube and apple keep the zones their exports were written in and chrome uses DEFAULT_TIMEZONE.
+# Every loader returns the schedule and a dict of the PRODUCTS asked for, taken from the same analyzer so the
+# export isn't read again for them; products are loaded first, so the schedule reuses what they read
+ANALYZERS = {
+    'youtube': lambda path, cache, timezone: YoutubeHistoryAnalyzer(path, engine="mmap", cache=cache,
+                                                                    timezone=timezone),
+    'chrome': lambda path, cache, timezone: BrowserHistoryAnalyzer(
+        path, DEFAULT_TIMEZONE if timezone is None else timezone, cache=cache),
+    'apple': lambda path, cache, timezone: AppleHealthAnalyzer(path, streaming=True, cache=cache, timezone=timezone),
+}
+# events: epoch seconds and utc offsets of every YouTube watch, Chrome visit or Apple step record
+# intervals: every Apple sleep record as SleepIntervals
+PRODUCTS = {
+    'youtube': {'events': YoutubeHistoryAnalyzer.event_times},
+    'chrome': {'events': BrowserHistoryAnalyzer.event_times},
+    'apple': {'events': AppleHealthAnalyzer.activity_times, 'intervals': AppleHealthAnalyzer.load_intervals},
+}
+
+def load_products(name, analyzer, products=()):
+    # like load_sources, a product that fails is reported and left out
+    found = {}
+    for product in products:
+        try:
+            with metrics.timer(f"load.{name}_{product}"):
+                found[product] = PRODUCTS[name][product](analyzer)
+        except Exception as e:
+            print(f"failed to load {product}: {name}: {type(e).__name__}: {e}")
+    return found
+
+def load_youtube(path, cache=None, store=None, timezone=None, products=()):
+    analyzer = ANALYZERS['youtube'](path, cache, timezone)
+    found = load_products('youtube', analyzer, products)
+    if store is None:
+        return analyzer.analyze(), found
+    return ingest(store, 'youtube', lambda since: (analyzer.analyze(since), analyzer.high_water_mark)), found
+
+def load_chrome(path, cache=None, store=None, timezone=None, products=()):
+    analyzer = ANALYZERS['chrome'](path, cache, timezone)
+    found = load_products('chrome', analyzer, products)
+    if store is None:
+        return analyzer.process_daily_timestamps(), found
+    return ingest(store, 'chrome',
+                  lambda since: (analyzer.process_daily_timestamps(since_usec=since), analyzer.high_water_mark)), found
+
+def load_apple(path, cache=None, store=None, timezone=None, products=()):
+    analyzer = ANALYZERS['apple'](path, cache, timezone)
+    found = load_products('apple', analyzer, products)
+    # with the sleep records loaded (as intervals, or along with the events), the schedule comes from them
+    # instead of another pass over the export
+    analyze = analyzer.analyze_intervals if analyzer.intervals is not None else analyzer.analyze
+    if store is None:
+        return analyze(), found
+    return ingest(store, 'apple', lambda since: (analyze(since), analyzer.high_water_mark)), found
+
+LOADERS = {'youtube': load_youtube, 'chrome': load_chrome, 'apple': load_apple}
+
+def run_loader(name, path, cache=None, store=None, timezone=None, products=()):
+    with metrics.timer(f"load.{name}"):
+        return LOADERS[name](path, cache, store, timezone, products)
+
+def _run_loader_in_worker(name, path, cache, store, timezone, products, instrument):
+    # worker processes start with their own metrics, so they are collected there and handed back with the result
+    metrics.enabled = instrument
+    metrics.reset()
+    return run_loader(name, path, cache, store, timezone, products), metrics.snapshot()
+
+def _collect(result):
+    loaded, snapshot = result
+    metrics.merge(snapshot)
+    return loaded
+
+def load_sources(paths, cache=None, jobs=len(LOADERS), store=None, timezone=None, products=None):
+    # runs each source's loader (in a process pool when jobs > 1); a source that fails to load is reported
+    # and comes back as an empty schedule instead of taking the other sources down with it. products: source ->
+    # names of PRODUCTS to load with it. Returns the schedules and, per source, the products that loaded
+    products = products or {}
+    results = {}
+    found = {}
+    started = timer.perf_counter()
+
+    def report(name, load):
+        try:
+            results[name], found[name] = load()
+            print(f"loaded data: {name} ({len(results[name])} days, {timer.perf_counter() - started:.1f}s)")
+        except Exception as e:
+            results[name], found[name] = DailySchedule(), {}
+            print(f"failed to load data: {name}: {type(e).__name__}: {e}")
+
+    if jobs <= 1:
+        for name, path in paths.items():
+            print(f"loading data: {name}")
+            report(name, lambda: run_loader(name, path, cache, store, timezone, products.get(name, ())))
+        return results, found
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        futures = {}
+        for name, path in paths.items():
+            print(f"loading data: {name}")
+            futures[executor.submit(_run_loader_in_worker, name, path, cache, store, timezone,
+                                    products.get(name, ()), metrics.enabled)] = name
+        for future in as_completed(futures):
+            report(futures[future], lambda: _collect(future.result()))
+    # in the order of `paths` rather than of completion, so what is printed and exported doesn't vary between runs
+    return {name: results[name] for name in paths}, {name: found[name] for name in paths}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Infer a sleep schedule from Google Takeout and Apple Health data.")
+    parser.add_argument("yt_path", help="filepath for youtube data (html)")
+    parser.add_argument("google_path", help="filepath for Chrome data (json)")
+    parser.add_argument("apple_path", help="filepath for Apple Health data (xml)")
+    parser.add_argument("--jobs", type=int, default=len(LOADERS),
+                        help="number of worker processes used to load the sources (1 loads them one after another)")
+    parser.add_argument("--plots", choices=PLOT_MODES, default="show",
+                        help="show figures interactively, save them to --plot-dir (no display needed), or skip them")
+    parser.add_argument("--plot-dir", default=".", help="where figures are written with --plots save")
+    parser.add_argument("--plot-format", choices=("png", "svg"), default="png", help="file format for saved figures")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="where parsed exports are cached between runs")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="size limit of the cache before least recently used entries are evicted")
+    parser.add_argument("--cache-hash", action="store_true",
+                        help="also key cache entries by a content hash of each export, not just size and mtime")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the exports from scratch")
+    parser.add_argument("--invalidate-cache", action="store_true", help="drop cached entries for the given exports first")
+    parser.add_argument("--timezone", help=f"zone (e.g. Europe/Berlin) to place every source in; by default youtube and "
+                                           f"apple keep the zones of their exports and chrome uses {DEFAULT_TIMEZONE}")
+    parser.add_argument("--travel", metavar="PATH",
+                        help="CSV of start,timezone rows placing each period in its own zone (overrides --timezone)")
+    parser.add_argument("--gaps", action="store_true",
+                        help="also detect sleep as the longest gap in YouTube and Chrome activity each night")
+    parser.add_argument("--gaps-apple", action="store_true", help="count Apple Health step records as activity too")
+    parser.add_argument("--gap-anchor-hour", type=float, default=DEFAULT_ANCHOR_HOUR,
+                        help="local hour at which each 24 hour window of the gap detector starts")
+    parser.add_argument("--nights", action="store_true",
+                        help="also summarize Apple Health sleep per night (time asleep, in bed and per stage)")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES,
+                        help="bootstrap and permutation resamples for the accuracy statistics")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="level of the bootstrap intervals")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed of the resampling, for reproducible results")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only analyze what is newer than the previous run and merge it into the stored schedules")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="where --incremental keeps the per-day schedules")
+    parser.add_argument("--reset-store", action="store_true", help="forget the stored schedules before an --incremental run")
+    parser.add_argument("--export-dir", help="write the event timelines, per-day schedules, accuracy diffs and Apple "
+                                             "sleep records here as columnar files (needs pyarrow)")
+    parser.add_argument("--export-format", choices=EXPORT_FORMATS, default="parquet",
+                        help="parquet, or arrow IPC files that can be memory-mapped")
+    parser.add_argument("--export-compression", default=DEFAULT_COMPRESSION,
+                        help="codec of the exported files (zstd, lz4 or none; parquet also snappy, gzip, brotli)")
+    parser.add_argument("--metrics", metavar="PATH", help="write per-stage timers and counters to PATH as JSON")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="run under cProfile and write the stats to PATH (workers aren't profiled; combine with --jobs 1)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="track allocations with tracemalloc and report the peak and top allocation sites")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics.enabled = bool(args.metrics or args.profile or args.trace_memory)
+    with Profiler(cprofile=bool(args.profile), trace_memory=args.trace_memory) as profiler:
+        with metrics.timer('run.total'):
+            run(args)
+
+    if args.profile:
+        profiler.dump_profile(args.profile)
+    if args.trace_memory:
+        print(f"Peak traced memory: {profiler.memory['peak_bytes'] / (1024 * 1024):.1f} MB")
+    if args.metrics:
+        dump_metrics(args.metrics, {'ijson_backend': IJSON_BACKEND.backend_name, **profiler.report()})
+
+def run(args):
+    yt_path = args.yt_path
+    google_path = args.google_path
+    apple_path = args.apple_path
+    if args.export_dir:
+        # fail before the parsing rather than after it
+        require_pyarrow()
+        if args.export_format == 'arrow' and args.export_compression not in ARROW_COMPRESSIONS:
+            raise ValueError(f"arrow files support {ARROW_COMPRESSIONS} compression, not {args.export_compression!r}")
+    cache = None
+    if not args.no_cache:
+        cache = SourceCache(args.cache_dir, args.cache_max_mb * 1024 * 1024, content_hash=args.cache_hash)
+        if args.invalidate_cache:
+            for path in (yt_path, google_path, apple_path):
+                cache.invalidate(path)
+    store = None
+    if args.incremental:
+        store = ScheduleStore(args.store_dir)
+        if args.reset_store:
+            store.clear()
+    timezone = read_travel_schedule(args.travel) if args.travel else args.timezone
+    # the event timelines and apple sleep records come back from the loaders that build the schedules
+    products = {source: [] for source in SOURCES}
+    if args.gaps or args.export_dir:
+        for source in ('youtube', 'chrome', 'apple') if args.gaps_apple else ('youtube', 'chrome'):
+            products[source].append('events')
+    if args.nights or args.export_dir:
+        products['apple'].append('intervals')
+    sources, found = load_sources({'youtube': yt_path, 'chrome': google_path, 'apple': apple_path}, cache, args.jobs,
+                                  store, timezone, products)
+    yt_data = sources['youtube']
+    google_data = sources['chrome']
+    apple_data = sources['apple']
+    events = {source: found[source]['events'] for source in SOURCES if 'events' in found[source]}
+    intervals = found['apple'].get('intervals')
+
+    extra = {}
+    if args.gaps:
+        timeline = ActivityTimeline.combine(*events.values())
+        extra['gaps'] = timeline.sleep_schedule(args.gap_anchor_hour)
+        print(f"detected sleep from activity gaps: {len(extra['gaps'])} nights from {len(timeline)} events")
+
+    aligned_data = align_datasets(yt_data, google_data, apple_data, **extra)
 
     avg_sleep_schedule = estimate_average_sleep_schedule(aligned_data)
     print("Average Sleep Schedule (Apple Ground Truth):", avg_sleep_schedule)
@@ -176,33 +367,46 @@ def main():
     chrome_avg_sleep_schedule = estimate_average_sleep_schedule(aligned_data, "chrome")
     print("Average Sleep Schedule (Chrome):", chrome_avg_sleep_schedule)
 
+    if args.gaps:
+        print("Average Sleep Schedule (Activity gaps):", estimate_average_sleep_schedule(aligned_data, "gaps"))
+
+    if args.nights and intervals is not None:
+        with metrics.timer('analysis.apple_nights'):
+            nights = intervals.nights()
+        if len(nights):
+            hours = {stage: round(float(nights.records[stage].mean()) / 3600, 2)
+                     for stage in ('asleep', 'in_bed', 'awake', 'core', 'deep', 'rem')}
+            print(f"Average Hours Per Night (Apple, {len(nights)} nights):", hours)
+
     accuracy = calculate_accuracy(aligned_data, avg_sleep_schedule)
-    print("Accuracy Comparison:", accuracy)
+    print("Accuracy Comparison:", {source: f"{len(diffs)} days" for source, diffs in accuracy.items()})
+
+    if args.export_dir:
+        paths = export(args.export_dir, args.export_format, args.export_compression, events=events,
+                       schedules={**sources, **extra}, accuracy=accuracy, intervals=intervals)
+        print("Exported:", ", ".join(paths.values()))
 
     accuracy_stats = calculate_statistics(accuracy)
     print("Accuracy Statistics:", accuracy_stats)
 
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(data=[accuracy['youtube'], accuracy['chrome']], palette='viridis')
-    plt.xticks(ticks=[0, 1], labels=['YouTube', 'Chrome'])
-    plt.title('Accuracy Comparison of Sleep Schedule Estimation')
-    plt.ylabel('Accuracy Difference (Lower is Better)')
-    plt.xlabel('Data Source')
-    plt.show()
-
-    plot_start_end_times(aligned_data)
+    if args.plots != 'none':
+        plot_accuracy(accuracy, args.plots, args.plot_dir, args.plot_format)
+        plot_start_end_times(aligned_data, args.plots, args.plot_dir, args.plot_format)
 
-    # T test
-    youtube_diffs = accuracy['youtube']
-    chrome_diffs = accuracy['chrome']
-    t_stat, p_value = ttest_ind(youtube_diffs, chrome_diffs)
+    resampled = resample_accuracy(accuracy, args.resamples, args.confidence, args.seed)
+    for source, interval in resampled['intervals'].items():
+        print(f"Mean Accuracy Difference ({source}): {interval['estimate']:.3f}, "
+              f"{args.confidence:.0%} CI [{interval['low']:.3f}, {interval['high']:.3f}]")
 
-    print(f"T-Statistic: {t_stat}")
-    print(f"P-Value: {p_value}")
+    paired = resampled['paired']
+    print(f"Paired Mean Difference (youtube - chrome, {paired['days']} days): {paired['mean_difference']:.3f}")
+    print(f"P-Value ({'exact' if paired['exact'] else paired['resamples']} sign-flip permutations): {paired['p_value']}")
 
     alpha = 0.05
-    if p_value < alpha:
+    if paired['p_value'] < alpha:
         print("Reject the null hypothesis: There is a statistically significant difference.")
     else:
         print("Fail to reject the null hypothesis: There is no statistically significant difference.")
 
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,70 @@
 import xml.etree.ElementTree as ET
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
+import os
+import numpy as np
+
+from instrumentation import metrics, timed
+from schedule import DailySchedule
+from sleepintervals import SleepIntervals, SleepNights, parse_health_dates
+from tzoffsets import offset_table
+SLEEP_RECORD_TYPE = "HKCategoryTypeIdentifierSleepAnalysis"
+# records that only exist while the wearer is up and about
+ACTIVITY_RECORD_TYPES = ("HKQuantityTypeIdentifierStepCount",)
+
+
+def _since_day(since):
+    # startDate strings begin with the local date, which is never more than a day off the UTC date, so
+    # records dated before this are older than `since` without parsing them
+    if since is None:
+        return None
+    return (datetime.fromtimestamp(since, timezone.utc) - timedelta(days=1)).date().isoformat()
+
+
+def _aware(seconds, offset):
+    return datetime.fromtimestamp(int(seconds), timezone(timedelta(seconds=int(offset))))
+
+
 class AppleHealthAnalyzer:
-    def __init__(self, file_path):
+    def __init__(self, file_path, streaming=False, cache=None, timezone=None):
+        # timezone: a zone name or an OffsetTable (e.g. a travel schedule) to place the records in, instead of
+        # the offsets the export was written with (those of wherever the phone was at export time)
         self.file_path = file_path
+        self.streaming = streaming
+        self.cache = cache
+        self.timezone = None if timezone is None else offset_table(timezone)
         self.schedule = {}
-    def parse_xml(self):
+        # epoch seconds of the latest sleep record startDate seen, for incremental runs
+        self.high_water_mark = None
+        self.intervals = None
+        # (epoch seconds, utc offsets) of the activity records read by the last parse_intervals
+        self.activity = None
+    @timed('apple.parse')
+    def parse_xml(self, since=None):
+        # since: epoch seconds; only records starting after it are folded in
+        since_day = _since_day(since)
         tree = ET.parse(self.file_path)
         root = tree.getroot()
         sleep_intervals = defaultdict(list)
         cutoff_date = datetime(2020, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
-        for record in root.findall('.//Record[@type="HKCategoryTypeIdentifierSleepAnalysis"]'):
+        records = root.findall(f'.//Record[@type="{SLEEP_RECORD_TYPE}"]')
+        metrics.count('apple.records_seen', len(records))
+        metrics.count('apple.bytes_read', os.path.getsize(self.file_path))
+        latest = None
+        for record in records:
             start_date = record.get('startDate')
             end_date = record.get('endDate')
+            if since_day is not None and start_date[:10] < since_day:
+                continue
 
             start_dt = datetime.strptime(start_date, '%Y-%m-%d %H:%M:%S %z')
             end_dt = datetime.strptime(end_date, '%Y-%m-%d %H:%M:%S %z')
-
-            if start_dt >= cutoff_date:
+            if latest is None or start_dt > latest:
+                latest = start_dt
+            if start_dt >= cutoff_date and (since is None or start_dt.timestamp() > since):
                 date_str = start_dt.date().isoformat()
                 sleep_intervals[date_str].append((start_dt, end_dt))
+        metrics.count('apple.records_kept', sum(map(len, sleep_intervals.values())))
         sleep_schedule = {}
         for date, intervals in sleep_intervals.items():
             earliest_start = min(intervals, key=lambda x: x[0])[0]
@@ -27,6 +72,173 @@ class AppleHealthAnalyzer:
             sleep_schedule[date] = (earliest_start, latest_end)
 
         self.schedule = sleep_schedule
+        self._update_high_water_mark(latest, since)
+
+    def _iter_records(self, record_types):
+        # streams the export and yields each <Record> of one of `record_types` once it is complete; elements
+        # behind it are cleared as the parse moves on, so memory stays flat regardless of export size. A record
+        # is only valid until the next one is requested
+        record_types = set(record_types)
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(self.file_path, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if elem.tag == 'Record' and elem.get('type') in record_types:
+                yield elem
+            if depth == 1:
+                # top-level child of <HealthData> is finished; drop it and everything before it
+                root.clear()
+
+    @timed('apple.parse')
+    def parse_xml_streaming(self, since=None):
+        # same result as parse_xml, but folds each sleep record into the schedule as it is read
+        # and clears elements behind it, so memory stays flat regardless of export size
+        sleep_schedule = {}
+        since_day = _since_day(since)
+        latest = None
+        cutoff_date = datetime(2020, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+        seen = 0
+        kept = 0
+        for elem in self._iter_records((SLEEP_RECORD_TYPE,)):
+            seen += 1
+            start_date = elem.get('startDate')
+            # records dated well before the mark are skipped without parsing their dates
+            if since_day is not None and start_date[:10] < since_day:
+                continue
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d %H:%M:%S %z')
+            end_dt = datetime.strptime(elem.get('endDate'), '%Y-%m-%d %H:%M:%S %z')
+            if latest is None or start_dt > latest:
+                latest = start_dt
+
+            if start_dt >= cutoff_date and (since is None or start_dt.timestamp() > since):
+                kept += 1
+                date_str = start_dt.date().isoformat()
+                if date_str not in sleep_schedule:
+                    sleep_schedule[date_str] = (start_dt, end_dt)
+                else:
+                    earliest_start, latest_end = sleep_schedule[date_str]
+                    if start_dt < earliest_start:
+                        earliest_start = start_dt
+                    if end_dt > latest_end:
+                        latest_end = end_dt
+                    sleep_schedule[date_str] = (earliest_start, latest_end)
+
+        metrics.count('apple.records_seen', seen)
+        metrics.count('apple.records_kept', kept)
+        metrics.count('apple.bytes_read', os.path.getsize(self.file_path))
+        self.schedule = sleep_schedule
+        self._update_high_water_mark(latest, since)
+
+    def _update_high_water_mark(self, latest, since):
+        self.high_water_mark = since
+        if latest is not None and (since is None or latest.timestamp() > since):
+            self.high_water_mark = int(latest.timestamp())
+
+    @timed('apple.intervals')
+    def parse_intervals(self, activity_types=(), include_sleep=True):
+        # every sleep record since the cutoff as SleepIntervals (self.intervals) and, from the same pass, the start
+        # epoch seconds and utc offsets of every record of `activity_types` (self.activity); only the attribute
+        # strings are collected while streaming, and the dates are parsed in one vectorized pass afterwards
+        start_dates, end_dates, values, source_names = [], [], [], []
+        activity_dates = []
+        record_types = ((SLEEP_RECORD_TYPE,) if include_sleep else ()) + tuple(activity_types)
+        for elem in self._iter_records(record_types):
+            if elem.get('type') == SLEEP_RECORD_TYPE:
+                start_dates.append(elem.get('startDate'))
+                end_dates.append(elem.get('endDate'))
+                values.append(elem.get('value'))
+                source_names.append(elem.get('sourceName', ''))
+            else:
+                activity_dates.append(elem.get('startDate'))
+
+        if include_sleep:
+            intervals = SleepIntervals.from_records(start_dates, end_dates, values, source_names)
+            cutoff = int(datetime(2020, 1, 1, 0, 0, 0, tzinfo=timezone.utc).timestamp())
+            self.intervals = intervals.select(intervals.starts >= cutoff)
+            metrics.count('apple.records_kept', len(self.intervals))
+        if activity_types:
+            self.activity = parse_health_dates(activity_dates)
+            metrics.count('apple.records_kept', len(activity_dates))
+        metrics.count('apple.records_seen', len(start_dates) + len(activity_dates))
+        metrics.count('apple.bytes_read', os.path.getsize(self.file_path))
+        return self.intervals
+
+    def _load_cached_intervals(self):
+        if self.cache is None:
+            return False
+        cached = self.cache.load('apple-intervals', self.file_path)
+        if cached is None:
+            return False
+        self.intervals = SleepIntervals(cached['starts'], cached['ends'], cached['offsets'], cached['end_offsets'],
+                                        cached['stages'], cached['sources'], cached['source_names'].tolist())
+        return True
+
+    def _store_cached_intervals(self):
+        if self.cache is None:
+            return
+        intervals = self.intervals
+        self.cache.store('apple-intervals', self.file_path, starts=intervals.starts, ends=intervals.ends,
+                         offsets=intervals.offsets, end_offsets=intervals.end_offsets, stages=intervals.stages,
+                         sources=intervals.sources, source_names=np.array(intervals.source_names, dtype=str))
+
+    def load_intervals(self) -> SleepIntervals:
+        # the sleep records as parsed by parse_intervals (cached as exported), placed in self.timezone if set
+        if self.intervals is None and not self._load_cached_intervals():
+            self.parse_intervals()
+            self._store_cached_intervals()
+        if self.timezone is None:
+            return self.intervals
+        return self.intervals.localized(self.timezone)
+
+    def analyze_nights(self, anchor_hour=None) -> SleepNights:
+        # per-night asleep/in-bed/stage totals with onset and wake, alongside the per-date schedule of analyze()
+        intervals = self.load_intervals()
+        if anchor_hour is None:
+            return intervals.nights()
+        return intervals.nights(anchor_hour)
+
+    @timed('apple.activity')
+    def activity_times(self, record_types=ACTIVITY_RECORD_TYPES):
+        # epoch seconds and utc offsets of the start of every record of `record_types`, for an activity timeline.
+        # Unless they are cached, the sleep records are collected in the same pass, for load_intervals and
+        # analyze_intervals to reuse
+        cached = self.intervals is not None or self._load_cached_intervals()
+        self.parse_intervals(record_types, include_sleep=not cached)
+        if not cached:
+            self._store_cached_intervals()
+        times, offsets = self.activity
+        if self.timezone is not None:
+            return times, self.timezone.offsets_at(times)
+        return times, offsets
+
+    def _load_cached_schedule(self):
+        if self.cache is None:
+            return None
+        cached = self.cache.load('apple-schedule', self.file_path)
+        if cached is None:
+            return None
+        schedule = DailySchedule.from_arrays(cached['dates'], cached['starts'], cached['ends'],
+                                             cached['start_offsets'], cached['end_offsets'])
+        self.schedule = {str(record['date']): (_aware(record['start'], record['start_offset']),
+                                               _aware(record['end'], record['end_offset']))
+                         for record in schedule.records}
+        # the cache only keeps each night's earliest start, which under-estimates the mark; that is safe, since
+        # merging a record into the store twice changes nothing
+        self._update_high_water_mark(max(start for start, _ in self.schedule.values()) if self.schedule else None, None)
+        return schedule
+
+    def _store_cached_schedule(self, schedule):
+        if self.cache is None:
+            return
+        records = schedule.records
+        self.cache.store('apple-schedule', self.file_path, dates=records['date'], starts=records['start'],
+                         ends=records['end'], start_offsets=records['start_offset'],
+                         end_offsets=records['end_offset'])
 
     def format_sleep_schedule(self):
         formatted_schedule = {}
@@ -34,7 +246,34 @@ class AppleHealthAnalyzer:
             formatted_schedule[date] = (earliest_start.strftime('%I:%M %p'),latest_end.strftime('%I:%M %p'))
         return formatted_schedule
 
-    def analyze(self):
-        self.parse_xml()
+    def analyze(self, since=None):
+        # since: epoch seconds of an earlier run's high_water_mark; only newer sleep records are analyzed
+        if self.timezone is not None:
+            return self.analyze_intervals(since)
+        schedule = self._load_cached_schedule()
+        if schedule is not None:
+            return schedule
+        if self.streaming:
+            self.parse_xml_streaming(since)
+        else:
+            self.parse_xml(since)
+        schedule = DailySchedule.from_datetimes((date, start, end) for date, (start, end) in self.schedule.items())
+        if since is None:
+            self._store_cached_schedule(schedule)
+        return schedule
 
-        return self.format_sleep_schedule()
+    @timed('apple.parse')
+    def analyze_intervals(self, since=None):
+        # analyze() from the vectorized intervals, for runs that need load_intervals anyway (and for records placed
+        # in self.timezone, since re-bucketing the streamed datetimes would need a zone conversion per record)
+        intervals = self.load_intervals()
+        if since is not None:
+            intervals = intervals.select(intervals.starts > since)
+        schedule = intervals.daily_schedule()
+        self.schedule = {str(record['date']): (_aware(record['start'], record['start_offset']),
+                                               _aware(record['end'], record['end_offset']))
+                         for record in schedule.records}
+        self.high_water_mark = since
+        if len(intervals) and (since is None or intervals.starts.max() > since):
+            self.high_water_mark = int(intervals.starts.max())
+        return schedule
@@ -0,0 +1,216 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from synthetic import GENERATORS, parse_size
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module, so no peak RSS there
+    resource = None
+
+# each stage runs in its own fresh process so peak RSS is per stage rather than cumulative; a stage returns
+# how many records it handled, and optionally the seconds of the part it wants timed
+
+
+def _youtube_soup(paths):
+    from youtubehistoryanalyzer import YoutubeHistoryAnalyzer
+    analyzer = YoutubeHistoryAnalyzer(paths['youtube'], jobs=1)
+    analyzer.analyze()
+    return len(analyzer.stamps), None
+
+
+def _youtube_mmap(paths):
+    from youtubehistoryanalyzer import YoutubeHistoryAnalyzer
+    analyzer = YoutubeHistoryAnalyzer(paths['youtube'], engine='mmap')
+    analyzer.analyze()
+    return len(analyzer.stamps), None
+
+
+def _chrome_daily(paths):
+    from browserhistoryanalyzer import BrowserHistoryAnalyzer
+    analyzer = BrowserHistoryAnalyzer(paths['chrome'])
+    analyzer.process_daily_timestamps()
+    return None, None
+
+
+def _chrome_all(paths):
+    from browserhistoryanalyzer import BrowserHistoryAnalyzer
+    BrowserHistoryAnalyzer(paths['chrome']).analyze_all()
+    return None, None
+
+
+def _chrome_items(paths):
+    from browserhistoryanalyzer import BrowserHistoryAnalyzer
+    BrowserHistoryAnalyzer(paths['chrome'], projection=False).analyze_all()
+    return None, None
+
+
+def _chrome_projected(paths):
+    from browserhistoryanalyzer import BrowserHistoryAnalyzer
+    BrowserHistoryAnalyzer(paths['chrome'], projection=True).analyze_all()
+    return None, None
+
+
+def _apple_tree(paths):
+    from applehealthanalyzer import AppleHealthAnalyzer
+    AppleHealthAnalyzer(paths['apple']).analyze()
+    return None, None
+
+
+def _apple_streaming(paths):
+    from applehealthanalyzer import AppleHealthAnalyzer
+    AppleHealthAnalyzer(paths['apple'], streaming=True).analyze()
+    return None, None
+
+
+def _analysis(paths):
+    import analyzer
+    sources, _ = analyzer.load_sources(paths, jobs=1)
+    started = timer.perf_counter()
+    aligned_data = analyzer.align_datasets(sources['youtube'], sources['chrome'], sources['apple'])
+    avg_sleep_schedule = analyzer.estimate_average_sleep_schedule(aligned_data)
+    for source in analyzer.SOURCES:
+        analyzer.estimate_average_sleep_schedule(aligned_data, source)
+    if avg_sleep_schedule[0] is not None:
+        accuracy = analyzer.calculate_accuracy(aligned_data, avg_sleep_schedule)
+        analyzer.calculate_statistics(accuracy)
+    return len(aligned_data), timer.perf_counter() - started
+
+
+STAGES = {
+    'youtube_soup': ('youtube', _youtube_soup),
+    'youtube_mmap': ('youtube', _youtube_mmap),
+    'chrome_daily': ('chrome', _chrome_daily),
+    'chrome_all': ('chrome', _chrome_all),
+    'chrome_items': ('chrome', _chrome_items),
+    'chrome_projected': ('chrome', _chrome_projected),
+    'apple_tree': ('apple', _apple_tree),
+    'apple_streaming': ('apple', _apple_streaming),
+    'analysis': (None, _analysis),
+}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_stage(name, paths):
+    # the project modules are imported up front so their import time isn't charged to the stage
+    importlib.import_module('analyzer')
+    started = timer.perf_counter()
+    records, timed = STAGES[name][1](paths)
+    wall = timed if timed is not None else timer.perf_counter() - started
+    return records, wall, _peak_rss_mb()
+
+
+def generate(data_dir, size_bytes, seed=0):
+    # writes (or reuses) one file per source for this size/seed; returns {source: path} and {source: records}
+    size_dir = os.path.join(data_dir, f"{size_bytes}-{seed}")
+    manifest_path = os.path.join(size_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    else:
+        os.makedirs(size_dir, exist_ok=True)
+        manifest = {}
+        for source, (filename, write) in GENERATORS.items():
+            print(f"generating {source} ({size_bytes} bytes)")
+            manifest[source] = write(os.path.join(size_dir, filename), size_bytes, seed=seed)
+        with open(manifest_path, "w") as file:
+            json.dump(manifest, file)
+    paths = {source: os.path.join(size_dir, filename) for source, (filename, _) in GENERATORS.items()}
+    return paths, manifest
+
+
+def run(sizes, stages, data_dir, seed=0):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for size_bytes in sizes:
+        paths, manifest = generate(data_dir, size_bytes, seed)
+        for name in stages:
+            source = STAGES[name][0]
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                records, wall, peak_rss_mb = executor.submit(_run_stage, name, paths).result()
+            if records is None:
+                records = manifest[source]
+            results.append({
+                "stage": name,
+                "size_bytes": size_bytes,
+                "input_bytes": os.path.getsize(paths[source]) if source else sum(map(os.path.getsize, paths.values())),
+                "records": records,
+                "wall_s": round(wall, 4),
+                "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+                "records_per_s": round(records / wall, 1) if wall > 0 else None,
+            })
+            rss = f"{peak_rss_mb:8.1f} MB" if peak_rss_mb is not None else f"{'n/a':>8} MB"
+            print(f"{name:16} {size_bytes:>14} B  {wall:9.3f} s  {rss}  {results[-1]['records_per_s']} rec/s")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # stages whose wall time grew by more than `tolerance` (a fraction) over the baseline
+    previous = {(entry["stage"], entry["size_bytes"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry["stage"], entry["size_bytes"]))
+        if before and before["wall_s"] > 0 and entry["wall_s"] > before["wall_s"] * (1 + tolerance):
+            regressions.append((entry["stage"], entry["size_bytes"], before["wall_s"], entry["wall_s"]))
+    return regressions
+
+
+def _ijson_backend():
+    from browserhistoryanalyzer import IJSON_BACKEND
+    return IJSON_BACKEND.backend_name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the parsers and the analysis stage on synthetic exports.")
+    parser.add_argument("--sizes", default="1MB,10MB", help="comma separated input sizes per source, e.g. 1MB,100MB,10GB")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--data-dir", default="bench_data", help="where generated exports are kept between runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_baseline.json", help="machine-readable results")
+    parser.add_argument("--compare", help="baseline JSON to check these results against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed wall-time growth over the baseline")
+    args = parser.parse_args(argv)
+
+    stages = args.stages.split(",")
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    results = run([parse_size(size) for size in args.sizes.split(",")], stages, args.data_dir, args.seed)
+    with open(args.output, "w") as file:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ijson_backend": _ijson_backend(),
+            "seed": args.seed,
+            "results": results,
+        }, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for stage, size_bytes, before, after in regressions:
+            print(f"regression: {stage} at {size_bytes} B went from {before:.3f} s to {after:.3f} s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
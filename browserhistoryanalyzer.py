@@ -1,19 +1,294 @@
 import json
+import mmap
+import os
+import re
+from array import array
 from collections import defaultdict
 from datetime import datetime, timedelta, time
 import platform
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Dict, Iterator, List, Tuple, Any, Optional, Union
 from statistics import mean, median
 import ijson
-import pytz
+import numpy as np
+
+from instrumentation import metrics, timed
+from schedule import DailySchedule
+from sourcecache import SourceCache
+from tzoffsets import ZoneSpec, offset_table
+
+DAILY_TIMESTAMPS_CUTOFF = datetime.strptime("01 01, 2025, 12:00:00 AM -0500", '%m %d, %Y, %I:%M:%S %p %z')
+DAILY_TIMESTAMPS_CUTOFF_USEC = int(DAILY_TIMESTAMPS_CUTOFF.timestamp()) * 1_000_000
+USEC_PER_DAY = 86_400 * 1_000_000
+DEFAULT_TIMEZONE = "US/Eastern"
+
+ORDERS = ('newest_first', 'oldest_first', 'unsorted')
+# fastest first; yajl2_c is the only one that also builds the records in C
+IJSON_BACKENDS = ('yajl2_c', 'yajl2_cffi', 'yajl2', 'python')
+HISTORY_ITEM = "Browser History.item"
+TIME_USEC_PATTERN = re.compile(rb'"time_usec"\s*:\s*(-?\d+)')
+# JSON strings (matched whole, so braces inside titles/urls don't count) and braces; unrolled so it can't
+# backtrack badly
+TOKEN_PATTERN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]')
+INDEX_BLOCK_RECORDS = 1024
+
+TimeBound = Union[int, datetime, None]
+
+
+def select_ijson_backend(preferred: Tuple[str, ...] = IJSON_BACKENDS):
+    # the first backend of `preferred` that loads here; ijson itself quietly defaults to whatever it finds
+    for name in preferred:
+        try:
+            return ijson.get_backend(name)
+        except ImportError:
+            continue
+    raise ImportError(f"none of the ijson backends {preferred} is available")
+
+
+IJSON_BACKEND = select_ijson_backend()
+
+
+def _to_usec(bound: TimeBound) -> Optional[int]:
+    if isinstance(bound, datetime):
+        return int(bound.timestamp() * 1_000_000)
+    return bound
+
+
+def _record_bounds(data: mmap.mmap, pos: int) -> Tuple[Optional[int], Optional[int]]:
+    # from a position inside a visit object (and outside any string): where that object ends and where the
+    # next one starts
+    depth = 1
+    end = None
+    for token in TOKEN_PATTERN.finditer(data, pos):
+        brace = data[token.start()]
+        if brace == ord('}'):
+            depth -= 1
+            if depth == 0:
+                end = token.end()
+        elif brace == ord('{'):
+            if depth == 0:
+                return end, token.start()
+            depth += 1
+        if depth < 0:
+            break
+    return end, None
+
+
+def build_index(file_path: str) -> Optional[Dict[str, np.ndarray]]:
+    # byte-offset index over blocks of INDEX_BLOCK_RECORDS visits: where each block starts and ends in the file,
+    # its min/max time_usec, and the sort order of the whole history. The time_usec values come from one regex
+    # findall over an mmap and the file is only tokenized around block boundaries, so this is much cheaper than
+    # a JSON parse. Assumes the flat visit objects Takeout writes; None when the layout is anything else
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            key = data.find(b'"Browser History"')
+            first = data.find(b'{', data.find(b'[', key)) if key != -1 else -1
+            if first == -1:
+                return None
+            matches = TIME_USEC_PATTERN.finditer(data, first)
+            value_ends = np.fromiter((match.end() for match in matches), dtype=np.int64)
+            if not len(value_ends):
+                return None
+            times = np.array(TIME_USEC_PATTERN.findall(data, first), dtype=np.int64)
+
+            block_firsts = np.arange(0, len(times), INDEX_BLOCK_RECORDS)
+            offsets = [first]
+            ends = []
+            for block in block_firsts[1:]:
+                end, start = _record_bounds(data, int(value_ends[block - 1]))
+                if start is None:
+                    return None
+                ends.append(end)
+                offsets.append(start)
+            end, _ = _record_bounds(data, int(value_ends[-1]))
+            if end is None:
+                return None
+            ends.append(end)
+
+    steps = np.diff(times)
+    order = 'newest_first' if (steps <= 0).all() else 'oldest_first' if (steps >= 0).all() else 'unsorted'
+    return {
+        'offsets': np.array(offsets, dtype=np.int64),
+        'ends': np.array(ends, dtype=np.int64),
+        'mins': np.minimum.reduceat(times, block_firsts),
+        'maxs': np.maximum.reduceat(times, block_firsts),
+        'order': np.array(order),
+    }
+
+
+class HistoryAggregator:
+    # one metric computed from a BrowserHistoryAnalyzer.scan pass; set `done` to stop receiving records.
+    # `fields` are the record keys consume() reads, or None for the whole record
+    needs_datetime = False
+    fields: Optional[Tuple[str, ...]] = None
+
+    def __init__(self, analyzer: "BrowserHistoryAnalyzer"):
+        self.analyzer = analyzer
+        self.done = False
+
+    def consume(self, record: Dict[str, Any], dt: Optional[datetime]) -> None:
+        raise NotImplementedError
+
+    def result(self) -> Any:
+        raise NotImplementedError
+
+
+class DailyPatternsAggregator(HistoryAggregator):
+    needs_datetime = True
+    fields = ('time_usec',)
+
+    def __init__(self, analyzer: "BrowserHistoryAnalyzer", cutoff_timestamp: Optional[int] = None):
+        super().__init__(analyzer)
+        self.cutoff_timestamp = cutoff_timestamp
+        self.daily_patterns: Dict[str, Dict[str, int]] = {}
+
+    def consume(self, record: Dict[str, Any], dt: Optional[datetime]) -> None:
+        if self.cutoff_timestamp and int(record["time_usec"]) < self.cutoff_timestamp:
+            self.done = True
+            return
+
+        timestamp = record["time_usec"]
+        date_str = dt.date().isoformat()
+
+        if date_str not in self.daily_patterns:
+            self.daily_patterns[date_str] = {
+                'first_activity': timestamp,
+                'last_activity': timestamp
+            }
+        else:
+            if timestamp < self.daily_patterns[date_str]['first_activity']:
+                self.daily_patterns[date_str]['first_activity'] = timestamp
+            if timestamp > self.daily_patterns[date_str]['last_activity']:
+                self.daily_patterns[date_str]['last_activity'] = timestamp
+
+    def result(self) -> Dict[str, Dict[str, int]]:
+        return self.daily_patterns
+
+
+class DailyTimestampsAggregator(HistoryAggregator):
+    needs_datetime = True
+    fields = ('time_usec',)
+
+    def __init__(self, analyzer: "BrowserHistoryAnalyzer"):
+        super().__init__(analyzer)
+        self.daily_timestamps: Dict[str, Dict[str, int]] = {}
+
+    def consume(self, record: Dict[str, Any], dt: Optional[datetime]) -> None:
+        timestamp = record["time_usec"]
+        date_str = dt.date().isoformat()
+        if dt < DAILY_TIMESTAMPS_CUTOFF:
+            return
+        if date_str not in self.daily_timestamps:
+            self.daily_timestamps[date_str] = {
+                'first_timestamp': timestamp,
+                'last_timestamp': timestamp
+            }
+        else:
+            if timestamp < self.daily_timestamps[date_str]['first_timestamp']:
+                self.daily_timestamps[date_str]['first_timestamp'] = timestamp
+            if timestamp > self.daily_timestamps[date_str]['last_timestamp']:
+                self.daily_timestamps[date_str]['last_timestamp'] = timestamp
+
+    def result(self) -> DailySchedule:
+        return self.analyzer._daily_schedule(self.daily_timestamps)
+
+
+class TimestampArrayAggregator(HistoryAggregator):
+    # vectorized counterpart of DailyTimestampsAggregator: only collects time_usec per record, and does
+    # tz conversion, date bucketing and the cutoff filter on the whole array at the end
+    fields = ('time_usec',)
+
+    def __init__(self, analyzer: "BrowserHistoryAnalyzer"):
+        super().__init__(analyzer)
+        self.times = array('q')
+
+    def consume(self, record: Dict[str, Any], dt: Optional[datetime]) -> None:
+        self.times.append(record["time_usec"])
+
+    def result(self) -> DailySchedule:
+        return self.analyzer.daily_schedule(self.array())
+
+    def array(self) -> np.ndarray:
+        return np.frombuffer(self.times, dtype=np.int64)
+
+
+class TitleAggregator(HistoryAggregator):
+    # accumulates into analyzer.titles, like process_history always has
+    fields = ('time_usec', 'title')
+
+    def __init__(self, analyzer: "BrowserHistoryAnalyzer", cutoff_timestamp: Optional[int] = None):
+        super().__init__(analyzer)
+        self.cutoff_timestamp = cutoff_timestamp
+
+    def consume(self, record: Dict[str, Any], dt: Optional[datetime]) -> None:
+        if self.cutoff_timestamp and int(record["time_usec"]) < self.cutoff_timestamp:
+            self.done = True
+            return
+
+        titles = self.analyzer.titles
+        normalized_title = self.analyzer._normalize_title(record['title'])
+        current_time = record['time_usec']
+
+        if normalized_title in titles:
+            if self.analyzer._is_valid_time_gap(current_time, titles[normalized_title]['latest']):
+                titles[normalized_title]['count'] += 1
+        else:
+            titles[normalized_title] = {'count': 1}
+
+        titles[normalized_title]['latest'] = current_time
+
+    def result(self) -> Dict[str, Dict[str, Any]]:
+        return self.analyzer.titles
+
+
+class LastSiteAggregator(HistoryAggregator):
+    needs_datetime = True
+    fields = ('time_usec', 'title')
+
+    def __init__(self, analyzer: "BrowserHistoryAnalyzer"):
+        super().__init__(analyzer)
+        self.last_site_per_day = {}
+
+    def consume(self, record: Dict[str, Any], dt: Optional[datetime]) -> None:
+        timestamp_usec = record["time_usec"]
+        date_str = dt.date()
+
+        if date_str not in self.last_site_per_day or timestamp_usec > self.last_site_per_day[date_str][0]:
+            self.last_site_per_day[date_str] = (timestamp_usec, self.analyzer._normalize_title(record["title"]))
+
+    def result(self) -> Tuple[Dict[str, Tuple[int, str]], List[Tuple[str, int]]]:
+        site_count = defaultdict(int)
+        for _, title in self.last_site_per_day.values():
+            site_count[title] += 1
+
+        sorted_frequencies = sorted(site_count.items(), key=lambda x: x[1], reverse=True)
+        return self.last_site_per_day, sorted_frequencies
 
 
 class BrowserHistoryAnalyzer:
-    def __init__(self, file_path: str, timezone: str = "US/Eastern"):
+    def __init__(self, file_path: str, timezone: ZoneSpec = DEFAULT_TIMEZONE, cache: Optional[SourceCache] = None,
+                 order: Optional[str] = None, projection: Optional[bool] = None):
+        # order: one of ORDERS when the caller knows how the history is sorted; otherwise it is detected.
+        # projection: build records from parse events holding only the fields the aggregators read, instead of
+        # whole dicts; by default only where the backend would build the dicts in Python anyway.
+        # timezone: a zone name or an OffsetTable (e.g. a travel schedule)
+        if order is not None and order not in ORDERS:
+            raise ValueError(f"unknown order {order!r}, expected one of {ORDERS}")
         self.file_path = file_path
-        self.timezone = pytz.timezone(timezone)
+        self.cache = cache
+        self.order = order
+        self.projection = IJSON_BACKEND.backend_name != 'yajl2_c' if projection is None else projection
+        self._index: Optional[Dict[str, np.ndarray]] = None
+        # (start_usec, time_usec) of the last load_times read or scan
+        self._times: Optional[Tuple[Optional[int], np.ndarray]] = None
+        self.timezone = offset_table(timezone)
         self.titles: Dict[str, Dict[str, Any]] = {}
         self.daily_patterns: Dict[str, Dict[str, int]] = {}
+        self.daily_timestamps = DailySchedule()
+        self.last_sites: Tuple[Dict[str, Tuple[int, str]], List[Tuple[str, int]]] = ({}, [])
+        # latest time_usec analyzed, for incremental runs
+        self.high_water_mark: Optional[int] = None
 
     def _normalize_title(self, title: str) -> str:
         title_lower = title.lower()
@@ -24,9 +299,7 @@ class BrowserHistoryAnalyzer:
         return title
 
     def _convert_timestamp(self, time_usec: int) -> datetime:
-        dt_utc = datetime.utcfromtimestamp(time_usec / 1_000_000)
-        dt_utc = dt_utc.replace(tzinfo=pytz.utc)
-        return dt_utc.astimezone(self.timezone)
+        return self.timezone.datetime_at(time_usec / 1_000_000)
 
     def _format_datetime(self, dt: datetime) -> str:
         format_str = "%b %#d %Y, %#I:%M%p" if platform.system() == "Windows" else "%b %-d %Y, %-I:%M%p"
@@ -35,66 +308,257 @@ class BrowserHistoryAnalyzer:
     def _format_time(self, dt: datetime) -> str:
         return dt.strftime("%I:%M %p")
 
+    def _local_usec(self, times_usec: np.ndarray) -> np.ndarray:
+        return times_usec + self.timezone.offsets_at(times_usec // 1_000_000).astype(np.int64) * 1_000_000
+
+    @timed('chrome.daily_schedule')
+    def daily_schedule(self, times_usec: np.ndarray,
+                       cutoff_usec: int = DAILY_TIMESTAMPS_CUTOFF_USEC) -> DailySchedule:
+        times_usec = times_usec[times_usec >= cutoff_usec]
+        metrics.count('chrome.records_kept', len(times_usec))
+        if not len(times_usec):
+            return DailySchedule()
+        days = self._local_usec(times_usec) // USEC_PER_DAY
+
+        order = np.argsort(days, kind='stable')
+        days = days[order]
+        times_usec = times_usec[order]
+        bounds = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+        firsts = np.minimum.reduceat(times_usec, bounds)
+        lasts = np.maximum.reduceat(times_usec, bounds)
+
+        return DailySchedule.from_arrays(
+            days[bounds].astype('datetime64[D]'),
+            firsts // 1_000_000,
+            lasts // 1_000_000,
+            (self._local_usec(firsts) - firsts) // 1_000_000,
+            (self._local_usec(lasts) - lasts) // 1_000_000,
+        )
+
+    def _daily_schedule(self, daily_timestamps: Dict[str, Dict[str, int]]) -> DailySchedule:
+        return DailySchedule.from_datetimes(
+            (date, self._convert_timestamp(timestamps['first_timestamp']), self._convert_timestamp(timestamps['last_timestamp']))
+            for date, timestamps in daily_timestamps.items()
+        )
+
     def _is_valid_time_gap(self, time_usec1: int, time_usec2: int, minutes: int = 5) -> bool:
         dt1 = datetime.utcfromtimestamp(time_usec1 / 1_000_000)
         dt2 = datetime.utcfromtimestamp(time_usec2 / 1_000_000)
         return dt2 - dt1 > timedelta(minutes=minutes)
 
+    def index(self) -> Optional[Dict[str, np.ndarray]]:
+        # the block index of build_index, cached alongside the parsed arrays
+        if self._index is None:
+            cached = self.cache.load('chrome-index', self.file_path) if self.cache is not None else None
+            if cached is not None:
+                self._index = cached
+            else:
+                with metrics.timer('chrome.index'):
+                    self._index = build_index(self.file_path) or {}
+                if self.cache is not None and self._index:
+                    self.cache.store('chrome-index', self.file_path, **self._index)
+        return self._index or None
+
+    def detect_order(self) -> str:
+        # 'unsorted' also covers files the index can't be built for
+        index = self.index()
+        return str(index['order']) if index is not None else 'unsorted'
+
+    def query(self, start: TimeBound = None, end: TimeBound = None,
+              fields: Optional[Tuple[str, ...]] = None) -> Iterator[Dict[str, Any]]:
+        # visits with start <= time_usec < end (bounds are time_usec or aware datetimes), in file order. With a
+        # known order the scan stops as soon as it is past the window; otherwise the block index is used to
+        # read only the blocks overlapping it. With `fields`, records may hold just those keys
+        start_usec, end_usec = _to_usec(start), _to_usec(end)
+        if fields is not None and 'time_usec' not in fields:
+            fields = ('time_usec',) + tuple(fields)
+        if start_usec is None and end_usec is None:
+            return self._stream(None, None, None, fields)
+        if self.order in ('newest_first', 'oldest_first'):
+            return self._stream(start_usec, end_usec, self.order, fields)
+        index = self.index()
+        if index is None:
+            return self._stream(start_usec, end_usec, None, fields)
+        return self._seek(index, start_usec, end_usec)
+
+    def _records(self, file, fields: Optional[Tuple[str, ...]]) -> Iterator[Dict[str, Any]]:
+        if fields is None or not self.projection:
+            return IJSON_BACKEND.items(file, HISTORY_ITEM)
+        return self._projected_records(file, fields)
+
+    def _projected_records(self, file, fields: Tuple[str, ...]) -> Iterator[Dict[str, Any]]:
+        prefixes = {f"{HISTORY_ITEM}.{field}": field for field in fields}
+        record = {}
+        for prefix, event, value in IJSON_BACKEND.parse(file):
+            field = prefixes.get(prefix)
+            if field is not None:
+                record[field] = value
+            elif event == 'end_map' and prefix == HISTORY_ITEM:
+                yield record
+                record = {}
+
+    def _stream(self, start_usec: Optional[int], end_usec: Optional[int], order: Optional[str],
+                fields: Optional[Tuple[str, ...]] = None) -> Iterator[Dict[str, Any]]:
+        # one ijson pass; for a declared order the records actually read are checked against it, and the scan
+        # only stops past the window once the next record confirms the order. A record out of the declared order
+        # turns it into an unordered scan of the rest of the file: everything before it was filtered just as an
+        # unordered scan would have, so nothing is lost or repeated
+        seen = 0
+        previous = None
+        past = False
+        with open(self.file_path, 'rb') as file:
+            try:
+                for record in self._records(file, fields):
+                    seen += 1
+                    time_usec = record["time_usec"]
+                    if order is not None and previous is not None and (
+                            time_usec > previous if order == 'newest_first' else time_usec < previous):
+                        metrics.count('chrome.order_fallbacks')
+                        order = None
+                    if order is not None:
+                        if past:
+                            break
+                        previous = time_usec
+                        before = start_usec is not None and time_usec < start_usec
+                        after = end_usec is not None and time_usec >= end_usec
+                        if before if order == 'newest_first' else after:
+                            past = True
+                            continue
+                        if before or after:
+                            continue
+                    elif (start_usec is not None and time_usec < start_usec) or (end_usec is not None and time_usec >= end_usec):
+                        continue
+                    yield record
+            finally:
+                metrics.count('chrome.records_seen', seen)
+                metrics.count('chrome.bytes_read', file.tell())
+
+    def _seek(self, index: Dict[str, np.ndarray], start_usec: Optional[int],
+              end_usec: Optional[int]) -> Iterator[Dict[str, Any]]:
+        # parses only the blocks whose time range overlaps the window, each run of adjacent blocks as one slice
+        overlaps = np.ones(len(index['offsets']), dtype=bool)
+        if start_usec is not None:
+            overlaps &= index['maxs'] >= start_usec
+        if end_usec is not None:
+            overlaps &= index['mins'] < end_usec
+        blocks = np.flatnonzero(overlaps)
+        if not len(blocks):
+            return
+        runs = np.split(blocks, np.flatnonzero(np.diff(blocks) > 1) + 1)
+        seen = 0
+        read = 0
+        with open(self.file_path, 'rb') as file:
+            try:
+                for run in runs:
+                    offset = int(index['offsets'][run[0]])
+                    file.seek(offset)
+                    text = file.read(int(index['ends'][run[-1]]) - offset)
+                    read += len(text)
+                    records = json.loads(b'[' + text + b']')
+                    seen += len(records)
+                    for record in records:
+                        time_usec = record["time_usec"]
+                        if (start_usec is None or time_usec >= start_usec) and (end_usec is None or time_usec < end_usec):
+                            yield record
+            finally:
+                metrics.count('chrome.records_seen', seen)
+                metrics.count('chrome.bytes_read', read)
+
+    def scan(self, aggregators: List[HistoryAggregator], start: TimeBound = None, end: TimeBound = None) -> None:
+        # single pass over the visits in [start, end) feeding every aggregator
+        active = [aggregator for aggregator in aggregators if not aggregator.done]
+        needs_datetime = any(aggregator.needs_datetime for aggregator in active)
+        fields = None
+        if all(aggregator.fields is not None for aggregator in active):
+            fields = tuple(sorted({field for aggregator in active for field in aggregator.fields}))
+
+        with metrics.timer('chrome.scan'):
+            records = self.query(start, end, fields)
+            for record in records:
+                dt = self._convert_timestamp(record["time_usec"]) if needs_datetime else None
+                for aggregator in active:
+                    aggregator.consume(record, dt)
+                if any(aggregator.done for aggregator in active):
+                    active = [aggregator for aggregator in active if not aggregator.done]
+                    if not active:
+                        break
+                    needs_datetime = any(aggregator.needs_datetime for aggregator in active)
+            records.close()
+
+    def analyze_all(self, cutoff_timestamp: Optional[int] = None) -> None:
+        patterns = DailyPatternsAggregator(self, cutoff_timestamp)
+        daily = TimestampArrayAggregator(self)
+        last_sites = LastSiteAggregator(self)
+        self.scan([patterns, TitleAggregator(self, cutoff_timestamp), daily, last_sites], start=cutoff_timestamp)
+
+        self.daily_patterns = patterns.result()
+        self.daily_timestamps = daily.result()
+        self.last_sites = last_sites.result()
+        self._store_times(daily.array(), cutoff_timestamp)
+
     def analyze_daily_patterns(self, cutoff_timestamp: Optional[int] = None) -> None:
-        self.daily_patterns = {}
-
-        with open(self.file_path, encoding='utf-8') as file:
-            for record in ijson.items(file, "Browser History.item"):
-                if cutoff_timestamp and int(record["time_usec"]) < cutoff_timestamp:
-                    break
-
-                timestamp = record["time_usec"]
-                dt = self._convert_timestamp(timestamp)
-                date_str = dt.date().isoformat()
-
-                if date_str not in self.daily_patterns:
-                    self.daily_patterns[date_str] = {
-                        'first_activity': timestamp,
-                        'last_activity': timestamp
-                    }
-                else:
-                    if timestamp < self.daily_patterns[date_str]['first_activity']:
-                        self.daily_patterns[date_str]['first_activity'] = timestamp
-                    if timestamp > self.daily_patterns[date_str]['last_activity']:
-                        self.daily_patterns[date_str]['last_activity'] = timestamp
-
-    def process_daily_timestamps(self) -> Dict[str, Tuple[str, str]]:
-        daily_timestamps = {}
-
-        with open(self.file_path, encoding='utf-8') as file:
-            for record in ijson.items(file, "Browser History.item"):
-                timestamp = record["time_usec"]
-                dt = self._convert_timestamp(timestamp)
-                date_str = dt.date().isoformat()
-                if dt < datetime.strptime("01 01, 2025, 12:00:00 AM -0500", '%m %d, %Y, %I:%M:%S %p %z'):
-                    continue
-                if date_str not in daily_timestamps:
-                    daily_timestamps[date_str] = {
-                        'first_timestamp': timestamp,
-                        'last_timestamp': timestamp
-                    }
-                else:
-                    if timestamp < daily_timestamps[date_str]['first_timestamp']:
-                        daily_timestamps[date_str]['first_timestamp'] = timestamp
-                    if timestamp > daily_timestamps[date_str]['last_timestamp']:
-                        daily_timestamps[date_str]['last_timestamp'] = timestamp
-
-        formatted_daily_timestamps = {}
-        for date, timestamps in daily_timestamps.items():
-            first_dt = self._convert_timestamp(timestamps['first_timestamp'])
-            last_dt = self._convert_timestamp(timestamps['last_timestamp'])
-
-            formatted_daily_timestamps[date] = (
-                self.normalize_for_analysis(self._format_datetime(first_dt)),
-                self.normalize_for_analysis(self._format_datetime(last_dt))
-            )
-
-        return formatted_daily_timestamps
+        patterns = DailyPatternsAggregator(self, cutoff_timestamp)
+        self.scan([patterns], start=cutoff_timestamp)
+        self.daily_patterns = patterns.result()
+
+    def load_times(self, start: TimeBound = None) -> np.ndarray:
+        # time_usec of every visit at or after `start`, from the cache when the export hasn't changed since the
+        # last run. The whole history and a bounded read are cached as separate entries, so runs asking for one
+        # don't evict the other; a bounded entry serves any start at or after its own. The times last loaded are
+        # also kept on the analyzer, so a second caller (event_times after process_daily_timestamps) reads nothing
+        start_usec = _to_usec(start)
+        bound = None if self._times is None else self._times[0]
+        if self._times is None or (bound is not None and (start_usec is None or bound > start_usec)):
+            self._times = self._load_cached_times(start_usec)
+            if self._times is None:
+                times = TimestampArrayAggregator(self)
+                self.scan([times], start=start_usec)
+                self._store_times(times.array(), start_usec)
+        times = self._times[1]
+        return times if start_usec is None else times[times >= start_usec]
+
+    def _load_cached_times(self, start_usec: Optional[int]) -> Optional[Tuple[Optional[int], np.ndarray]]:
+        # (bound, time_usec) of a cache entry covering `start_usec`
+        if self.cache is None:
+            return None
+        cached = self.cache.load('chrome', self.file_path)
+        # entries with a bound here were written before bounded reads were kept apart
+        if cached is not None and 'start_usec' not in cached:
+            return None, cached['time_usec']
+        if start_usec is not None:
+            cached = self.cache.load('chrome-bounded', self.file_path)
+            if cached is not None and cached['start_usec'][0] <= start_usec:
+                return int(cached['start_usec'][0]), cached['time_usec']
+        return None
+
+    def _store_times(self, times: np.ndarray, start_usec: Optional[int]) -> None:
+        self._times = (start_usec, times)
+        if self.cache is None:
+            return
+        if start_usec is None:
+            self.cache.store('chrome', self.file_path, time_usec=times)
+        else:
+            self.cache.store('chrome-bounded', self.file_path, time_usec=times,
+                             start_usec=np.array([start_usec], dtype=np.int64))
+
+    def event_times(self) -> Tuple[np.ndarray, np.ndarray]:
+        # epoch seconds and utc offsets of every visit, for an activity timeline
+        times = self.load_times()
+        return times // 1_000_000, ((self._local_usec(times) - times) // 1_000_000).astype(np.int32)
+
+    def process_daily_timestamps(self, vectorized: bool = True, since_usec: Optional[int] = None) -> DailySchedule:
+        # only visits past the cutoff (and past since_usec, for incremental runs) are read
+        start_usec = DAILY_TIMESTAMPS_CUTOFF_USEC if since_usec is None else max(DAILY_TIMESTAMPS_CUTOFF_USEC, since_usec + 1)
+        if vectorized or since_usec is not None:
+            times = self.load_times(start_usec)
+            self.high_water_mark = since_usec
+            if len(times) and (since_usec is None or times.max() > since_usec):
+                self.high_water_mark = int(times.max())
+            return self.daily_schedule(times)
+
+        daily = DailyTimestampsAggregator(self)
+        self.scan([daily], start=start_usec)
+        return daily.result()
 
     def normalize_for_analysis(self, dt): # added to better format outputs between this class and the others used for analysis
         ind = dt.find(":")
@@ -148,21 +612,7 @@ class BrowserHistoryAnalyzer:
         }
 
     def process_history(self, cutoff_timestamp: Optional[int] = None) -> None:
-        with open(self.file_path, encoding='utf-8') as file:
-            for record in ijson.items(file, "Browser History.item"):
-                if cutoff_timestamp and int(record["time_usec"]) < cutoff_timestamp:
-                    break
-
-                normalized_title = self._normalize_title(record['title'])
-                current_time = record['time_usec']
-
-                if normalized_title in self.titles:
-                    if self._is_valid_time_gap(current_time, self.titles[normalized_title]['latest']):
-                        self.titles[normalized_title]['count'] += 1
-                else:
-                    self.titles[normalized_title] = {'count': 1}
-
-                self.titles[normalized_title]['latest'] = current_time
+        self.scan([TitleAggregator(self, cutoff_timestamp)], start=cutoff_timestamp)
 
     def get_filtered_titles(self, min_count: int = 10) -> Dict[str, Dict[str, Any]]:
         return {title: data for title, data in self.titles.items()
@@ -173,29 +623,24 @@ class BrowserHistoryAnalyzer:
         title_list = [{"name": title, **data} for title, data in filtered.items()]
         return sorted(title_list, key=lambda d: d['count'], reverse=True)
 
-    def get_last_sites_per_day(self) -> Tuple[Dict[str, Tuple[int, str]], List[Tuple[str, int]]]:
-        last_site_per_day = {}
-        site_count = defaultdict(int)
-
-        with open(self.file_path, encoding='utf-8') as file:
-            for record in ijson.items(file, "Browser History.item"):
-                timestamp_usec = record["time_usec"]
-                title = self._normalize_title(record["title"])
-                date_str = self._convert_timestamp(timestamp_usec).date()
-
-                if date_str not in last_site_per_day or timestamp_usec > last_site_per_day[date_str][0]:
-                    last_site_per_day[date_str] = (timestamp_usec, title)
-
-        for _, title in last_site_per_day.values():
-            site_count[title] += 1
-
-        sorted_frequencies = sorted(site_count.items(), key=lambda x: x[1], reverse=True)
-        return last_site_per_day, sorted_frequencies
+    def get_last_sites_per_day(self, cutoff_timestamp: Optional[int] = None) -> Tuple[Dict[str, Tuple[int, str]], List[Tuple[str, int]]]:
+        last_sites = LastSiteAggregator(self)
+        self.scan([last_sites], start=cutoff_timestamp)
+        return last_sites.result()
 
     def save_results(self, filtered_output: str = "output.json",
                      sorted_output: str = "sorted.json",
                      patterns_output: str = "sleep_patterns.json",
                      min_count: int = 10) -> None:
+        # fill in whatever hasn't been computed yet with a single pass over the file
+        patterns = DailyPatternsAggregator(self) if not self.daily_patterns else None
+        aggregators = [aggregator for aggregator in (patterns, None if self.titles else TitleAggregator(self))
+                       if aggregator is not None]
+        if aggregators:
+            self.scan(aggregators)
+        if patterns is not None:
+            self.daily_patterns = patterns.result()
+
         filtered_data = self.get_filtered_titles(min_count)
         sorted_data = self.get_sorted_titles(min_count)
         sleep_data = self.calculate_sleep_schedule()
@@ -0,0 +1,190 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time as timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import analyzer
+from sourcecache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, SourceCache
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module, so no memory limit there
+    resource = None
+
+# runs the single-user pipeline of analyzer.py for every participant of a manifest, one user per worker
+# process, and collects the accuracy results into one table
+
+DEFAULT_MEMORY_LIMIT_MB = 4096
+# failures worth another attempt; anything else (no Apple data, a parse error, ...) would just fail again
+RETRYABLE = (MemoryError, OSError, BrokenProcessPool)
+NOT_RETRYABLE = (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError)
+STAT_NAMES = ('mean', 'std', 'min', 'max')
+
+
+def read_manifest(path):
+    # CSV with user,youtube,chrome,apple columns, or a JSON list of objects with the same keys; relative
+    # export paths are taken relative to the manifest
+    if path.endswith(".json"):
+        with open(path) as file:
+            rows = json.load(file)
+    else:
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+    base = os.path.dirname(os.path.abspath(path))
+    users = []
+    for number, row in enumerate(rows, start=1):
+        missing = [key for key in ("user",) + analyzer.SOURCES if not row.get(key)]
+        if missing:
+            raise ValueError(f"{path}: entry {number} has no {', '.join(missing)}")
+        users.append((row["user"], {source: os.path.join(base, row[source]) for source in analyzer.SOURCES}))
+    names = [user for user, _ in users]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: user names must be unique")
+    return users
+
+
+def _limit_memory(memory_limit_mb):
+    # caps the address space of this worker; with one task per worker that is a per-user limit. Skipped where
+    # the platform can't set one
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def analyze_user(user, paths, cache=None):
+    # the same steps analyzer.run takes for one person, minus the printing and plotting
+    schedules = {source: analyzer.run_loader(source, paths[source], cache)[0] for source in analyzer.SOURCES}
+    aligned_data = analyzer.align_datasets(schedules['youtube'], schedules['chrome'], schedules['apple'])
+    avg_sleep_schedule = analyzer.estimate_average_sleep_schedule(aligned_data)
+    if avg_sleep_schedule[0] is None:
+        raise ValueError("no Apple Health sleep data to compare against")
+    accuracy = analyzer.calculate_accuracy(aligned_data, avg_sleep_schedule)
+    return {
+        'user': user,
+        'days': {source: len(schedule) for source, schedule in schedules.items()},
+        'avg_sleep_schedule': avg_sleep_schedule,
+        'statistics': analyzer.calculate_statistics(accuracy),
+        'resampled': analyzer.resample_accuracy(accuracy),
+        'diffs': {source: diffs.to_numpy(dtype=float) for source, diffs in accuracy.items()},
+    }
+
+
+def run_cohort(users, jobs=None, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, retries=1, cache=None):
+    # every user gets a fresh worker (max_tasks_per_child=1) so a memory limit or a leak can't carry over to
+    # the next one. Users whose attempt failed with a RETRYABLE error are resubmitted, in a new pool if a worker
+    # died and took the pool down; users still failing after `retries` extra attempts are reported in `failures`
+    jobs = jobs or os.cpu_count() or 1
+    results = {}
+    failures = {}
+    attempts = {user: 0 for user, _ in users}
+    pending = list(users)
+    started = timer.perf_counter()
+    while pending:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending)), max_tasks_per_child=1,
+                                 initializer=_limit_memory, initargs=(memory_limit_mb,)) as executor:
+            futures = {executor.submit(analyze_user, user, paths, cache): (user, paths) for user, paths in pending}
+            pending = []
+            for future in as_completed(futures):
+                user, paths = futures[future]
+                attempts[user] += 1
+                try:
+                    results[user] = future.result()
+                    print(f"analyzed user: {user} ({len(results) + len(failures)}/{len(users)}, "
+                          f"{timer.perf_counter() - started:.1f}s)")
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    if isinstance(e, RETRYABLE) and not isinstance(e, NOT_RETRYABLE) and attempts[user] <= retries:
+                        print(f"retrying user: {user}: {error}")
+                        pending.append((user, paths))
+                    else:
+                        failures[user] = error
+                        print(f"failed user: {user}: {error}")
+    return results, failures, attempts
+
+
+def cohort_table(users, results, failures, attempts):
+    # one row per user in manifest order: status, days loaded per source and the accuracy statistics
+    import pandas as pd
+
+    rows = []
+    for user, _ in users:
+        row = {'user': user, 'status': 'ok' if user in results else 'failed', 'attempts': attempts[user]}
+        result = results.get(user)
+        for source in analyzer.SOURCES:
+            row[f'{source}_days'] = result['days'][source] if result else np.nan
+        for source in ('youtube', 'chrome'):
+            stats = result['statistics'].get(source, {}) if result else {}
+            row[f'{source}_n'] = len(result['diffs'][source]) if result else np.nan
+            for name in STAT_NAMES:
+                row[f'{source}_{name}'] = float(stats[name]) if name in stats else np.nan
+            interval = result['resampled']['intervals'][source] if result else {}
+            row[f'{source}_ci_low'] = interval.get('low', np.nan)
+            row[f'{source}_ci_high'] = interval.get('high', np.nan)
+        row['paired_p_value'] = result['resampled']['paired']['p_value'] if result else np.nan
+        row['error'] = failures.get(user, '')
+        rows.append(row)
+    table = pd.DataFrame(rows).set_index('user')
+    counts = [column for column in table.columns if column.endswith(('_days', '_n'))]
+    table[counts] = table[counts].astype('Int64')
+    return table
+
+
+def cohort_summary(results):
+    # per source: users with any overlap, pooled statistics over every user's dates, and the mean of user means
+    summary = {}
+    for source in ('youtube', 'chrome'):
+        diffs = [result['diffs'][source] for result in results.values() if len(result['diffs'][source])]
+        pooled = np.concatenate(diffs) if diffs else np.empty(0)
+        summary[source] = {
+            'users': len(diffs),
+            'days': len(pooled),
+            'pooled': analyzer.calculate_statistics({source: pooled})[source] if len(pooled) else None,
+            'mean_of_user_means': float(np.mean([values.mean() for values in diffs])) if diffs else None,
+        }
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the sleep schedule comparison for every user of a cohort.")
+    parser.add_argument("manifest", help="CSV (user,youtube,chrome,apple) or JSON list of per-user export paths")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="users analyzed in parallel")
+    parser.add_argument("--memory-limit-mb", type=int, default=DEFAULT_MEMORY_LIMIT_MB,
+                        help="address space limit of each user's worker (0 for none; ignored on Windows)")
+    parser.add_argument("--retries", type=int, default=1,
+                        help="extra attempts for users that failed on memory, I/O or a crashed worker")
+    parser.add_argument("--output", default="cohort.csv", help="per-user results table")
+    parser.add_argument("--summary", help="also write the cohort-level summary to this JSON file")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="where parsed exports are cached between runs")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the exports from scratch")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    users = read_manifest(args.manifest)
+    cache = None if args.no_cache else SourceCache(args.cache_dir, DEFAULT_MAX_BYTES)
+    results, failures, attempts = run_cohort(users, args.jobs, args.memory_limit_mb, args.retries, cache)
+
+    table = cohort_table(users, results, failures, attempts)
+    table.to_csv(args.output)
+    summary = cohort_summary(results)
+    print(f"Cohort: {len(results)} of {len(users)} users analyzed, results in {args.output}")
+    for source, entry in summary.items():
+        print(f"Accuracy ({source}, {entry['users']} users, {entry['days']} days):", entry['pooled'],
+              "mean of user means:", entry['mean_of_user_means'])
+    if args.summary:
+        with open(args.summary, "w") as file:
+            json.dump(summary, file, indent=2, default=float)
+    if failures:
+        print(f"{len(failures)} users failed: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
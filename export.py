@@ -0,0 +1,174 @@
+import functools
+import os
+import tempfile
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from instrumentation import metrics, timed
+from schedule import SCHEDULE_DTYPE, DailySchedule
+from sleepintervals import STAGES, SleepIntervals
+
+# columnar export of what a run extracted, for dashboards and notebooks that shouldn't re-run the parsers.
+# pyarrow is only needed here, so it isn't imported until something is exported. Every table is in long form
+# (one row per source and date or event) so its columns don't depend on which sources a run had
+EXPORT_FORMATS = ('parquet', 'arrow')
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+# arrow IPC files only support these; parquet also takes snappy, gzip and brotli. Uncompressed arrow files can
+# be memory-mapped without copying
+ARROW_COMPRESSIONS = ('zstd', 'lz4', 'none')
+DEFAULT_COMPRESSION = 'zstd'
+# bumped whenever a column is added, renamed or changes type; stored in every file's schema metadata
+SCHEMA_VERSION = 2
+
+Events = Mapping[str, Tuple[np.ndarray, np.ndarray]]
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("exporting needs pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+@functools.lru_cache(maxsize=None)
+def schemas():
+    # events: one row per activity event (youtube watch, chrome visit, apple step record)
+    # schedules: one row per source and date, as in align_datasets (hours are local hours of day)
+    # accuracy: per-date accuracy diffs of calculate_accuracy
+    # sleep_records: every apple sleep analysis record, stage as in sleepintervals.STAGES
+    pa = require_pyarrow()
+    # parquet has no seconds unit and reads second timestamps back as milliseconds, so both formats store those
+    timestamp = pa.timestamp('ms', tz='UTC')
+    label = pa.dictionary(pa.int16(), pa.string())
+    fields = {
+        'events': [('source', label), ('time', timestamp), ('utc_offset', pa.int32())],
+        'schedules': [('source', label), ('date', pa.date32()), ('start', timestamp), ('end', timestamp),
+                      ('start_offset', pa.int32()), ('end_offset', pa.int32()),
+                      ('start_hour', pa.float64()), ('end_hour', pa.float64())],
+        'accuracy': [('source', label), ('date', pa.date32()), ('diff_hours', pa.float64())],
+        'sleep_records': [('start', timestamp), ('end', timestamp), ('start_offset', pa.int32()),
+                          ('end_offset', pa.int32()), ('stage', label), ('source_name', label)],
+    }
+    return {name: pa.schema(columns, metadata={'sleeptracker.table': name,
+                                               'sleeptracker.schema_version': str(SCHEMA_VERSION)})
+            for name, columns in fields.items()}
+
+
+def _labels(codes, names: List[str]):
+    # dictionary-encoded strings; negative codes are nulls
+    pa = require_pyarrow()
+    codes = np.asarray(codes, dtype=np.int16)
+    return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), pa.array(names, type=pa.string()))
+
+
+def _repeat_labels(names: List[str], counts: List[int]):
+    return _labels(np.repeat(np.arange(len(names), dtype=np.int16), counts), names)
+
+
+def _concat(arrays, dtype) -> np.ndarray:
+    return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+
+
+def _seconds(values):
+    # epoch seconds as the schemas' millisecond timestamps
+    pa = require_pyarrow()
+    return pa.array(np.asarray(values, dtype=np.int64).astype('datetime64[s]').astype('datetime64[ms]'),
+                    type=pa.timestamp('ms', tz='UTC'))
+
+
+def events_table(events: Events):
+    pa = require_pyarrow()
+    names = list(events)
+    times = _concat([times for times, _ in events.values()], np.int64)
+    offsets = _concat([offsets for _, offsets in events.values()], np.int32)
+    counts = [len(times) for times, _ in events.values()]
+    return pa.Table.from_arrays([_repeat_labels(names, counts), _seconds(times), pa.array(offsets, pa.int32())],
+                                schema=schemas()['events'])
+
+
+def schedules_table(schedules: Mapping[str, DailySchedule]):
+    pa = require_pyarrow()
+    names = list(schedules)
+    records = _concat([schedule.records for schedule in schedules.values()], SCHEDULE_DTYPE)
+    return pa.Table.from_arrays([
+        _repeat_labels(names, [len(schedule) for schedule in schedules.values()]),
+        pa.array(records['date'], pa.date32()),
+        _seconds(records['start']),
+        _seconds(records['end']),
+        pa.array(records['start_offset'], pa.int32()),
+        pa.array(records['end_offset'], pa.int32()),
+        pa.array(_concat([schedule.start_hours() for schedule in schedules.values()], np.float64)),
+        pa.array(_concat([schedule.end_hours() for schedule in schedules.values()], np.float64)),
+    ], schema=schemas()['schedules'])
+
+
+def accuracy_table(accuracy):
+    # accuracy: source -> date-indexed series, as calculate_accuracy returns
+    pa = require_pyarrow()
+    names = list(accuracy)
+    return pa.Table.from_arrays([
+        _repeat_labels(names, [len(diffs) for diffs in accuracy.values()]),
+        pa.array(_concat([diffs.index.to_numpy(dtype='datetime64[D]') for diffs in accuracy.values()],
+                         'datetime64[D]'), pa.date32()),
+        pa.array(_concat([diffs.to_numpy(dtype=float) for diffs in accuracy.values()], np.float64)),
+    ], schema=schemas()['accuracy'])
+
+
+def sleep_records_table(intervals: SleepIntervals):
+    pa = require_pyarrow()
+    return pa.Table.from_arrays([
+        _seconds(intervals.starts),
+        _seconds(intervals.ends),
+        pa.array(intervals.offsets, pa.int32()),
+        pa.array(intervals.end_offsets, pa.int32()),
+        _labels(intervals.stages, list(STAGES)),
+        _labels(intervals.sources, intervals.source_names),
+    ], schema=schemas()['sleep_records'])
+
+
+def write_table(table, path: str, export_format: str = 'parquet', compression: str = DEFAULT_COMPRESSION) -> None:
+    # written next to `path` and moved into place, so readers never see a partial file
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}")
+    if export_format == 'arrow' and compression not in ARROW_COMPRESSIONS:
+        raise ValueError(f"arrow files support {ARROW_COMPRESSIONS} compression, not {compression!r}")
+    pa = require_pyarrow()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        if export_format == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, tmp_path, compression=compression)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=None if compression == 'none' else compression)
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@timed('export.write')
+def export(export_dir: str, export_format: str = 'parquet', compression: str = DEFAULT_COMPRESSION,
+           events: Optional[Events] = None, schedules: Optional[Mapping[str, DailySchedule]] = None,
+           accuracy=None, intervals: Optional[SleepIntervals] = None) -> Dict[str, str]:
+    # writes a <table><extension> file into export_dir for each of the given parts; returns table -> path
+    tables = {
+        'events': None if events is None else events_table(events),
+        'schedules': None if schedules is None else schedules_table(schedules),
+        'accuracy': None if accuracy is None else accuracy_table(accuracy),
+        'sleep_records': None if intervals is None else sleep_records_table(intervals),
+    }
+    paths = {}
+    for name, table in tables.items():
+        if table is None:
+            continue
+        paths[name] = os.path.join(export_dir, name + EXTENSIONS[export_format])
+        write_table(table, paths[name], export_format, compression)
+        metrics.count(f'export.{name}_rows', table.num_rows)
+    return paths
@@ -0,0 +1,66 @@
+import os
+import tempfile
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from instrumentation import metrics
+from schedule import SCHEDULE_DTYPE, DailySchedule
+
+# unlike the source cache this can't be rebuilt from the current exports once older history has been pruned
+# from them, so it lives outside ~/.cache
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "sleeptracker")
+
+
+class ScheduleStore:
+    # per-source daily schedule accumulated over successive exports, together with the high-water mark of the
+    # newest event folded into it (time_usec for chrome, epoch seconds for apple and youtube)
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+
+    def _path(self, source: str) -> str:
+        return os.path.join(self.store_dir, f"{source}.npz")
+
+    def load(self, source: str) -> Tuple[Optional[int], DailySchedule]:
+        try:
+            with np.load(self._path(source), allow_pickle=False) as data:
+                mark = data["mark"]
+                records = data["records"].astype(SCHEDULE_DTYPE)
+        except (OSError, ValueError, KeyError):
+            return None, DailySchedule()
+        return (int(mark[0]) if mark.size else None), DailySchedule(records)
+
+    def save(self, source: str, mark: Optional[int], schedule: DailySchedule) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        marks = np.array([] if mark is None else [mark], dtype=np.int64)
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez_compressed(file, mark=marks, records=schedule.records)
+            os.replace(tmp_path, self._path(source))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self, source: Optional[str] = None) -> None:
+        # forgets one source, or every source when none is given
+        if not os.path.isdir(self.store_dir):
+            return
+        for name in os.listdir(self.store_dir):
+            if name.endswith(".npz") and (source is None or name == f"{source}.npz"):
+                os.remove(os.path.join(self.store_dir, name))
+
+
+def ingest(store: ScheduleStore, source: str,
+           analyze: Callable[[Optional[int]], Tuple[DailySchedule, Optional[int]]]) -> DailySchedule:
+    # analyze(since) looks only at events after `since` and returns their schedule and the new high-water mark;
+    # the days it returns are merged into the stored ones (earliest start and latest end win), which makes
+    # folding the same events in twice harmless, so a conservative mark is always safe
+    mark, schedule = store.load(source)
+    new_schedule, new_mark = analyze(mark)
+    metrics.count(f"store.{source}.new_days", len(new_schedule))
+    if new_mark is not None and (mark is None or new_mark > mark):
+        mark = new_mark
+    schedule = schedule.merge(new_schedule)
+    store.save(source, mark, schedule)
+    return schedule
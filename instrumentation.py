@@ -0,0 +1,129 @@
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time as timer
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Optional
+
+_DISABLED = nullcontext()
+
+
+class Metrics:
+    # named timers and counters for the pipeline; everything is a no-op until `enabled` is set, and callers
+    # count per scan (not per record) so that the disabled cost is one attribute check per stage
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.timers: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def timer(self, name: str):
+        if not self.enabled:
+            return _DISABLED
+        return self._timer(name)
+
+    @contextmanager
+    def _timer(self, name: str):
+        started = timer.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += timer.perf_counter() - started
+            self.calls[name] += 1
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'timers': {name: {'seconds': round(seconds, 6), 'calls': self.calls[name]}
+                       for name, seconds in sorted(self.timers.items())},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        # folds in a snapshot taken in a worker process
+        for name, entry in snapshot['timers'].items():
+            self.timers[name] += entry['seconds']
+            self.calls[name] += entry['calls']
+        for name, value in snapshot['counters'].items():
+            self.counters[name] += value
+
+
+metrics = Metrics()
+
+
+def timed(name: str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            with metrics._timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    # opt-in cProfile / tracemalloc around a whole run; report() returns what ended up in the JSON dump
+    def __init__(self, cprofile: bool = False, trace_memory: bool = False, top: int = 25):
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self.trace_memory = trace_memory
+        self.top = top
+        self.stats: Optional[pstats.Stats] = None
+        self.memory: Dict[str, Any] = {}
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.stats = pstats.Stats(self.cprofile)
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.memory = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top_allocations': [{'location': str(stat.traceback), 'bytes': stat.size, 'blocks': stat.count}
+                                    for stat in snapshot.statistics('lineno')[:self.top]],
+            }
+        return False
+
+    def dump_profile(self, path: str) -> None:
+        if self.stats is not None:
+            self.stats.dump_stats(path)
+
+    def report(self) -> Dict[str, Any]:
+        report = {}
+        if self.stats is not None:
+            text = io.StringIO()
+            self.stats.stream = text
+            self.stats.sort_stats('cumulative').print_stats(self.top)
+            report['profile'] = text.getvalue()
+        if self.memory:
+            report['memory'] = self.memory
+        return report
+
+
+def dump_metrics(path: str, extra: Optional[Dict[str, Any]] = None) -> None:
+    data = metrics.snapshot()
+    if extra:
+        data.update(extra)
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=2)
@@ -0,0 +1,76 @@
+from typing import Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+from instrumentation import metrics, timed
+
+# resampling statistics over per-day accuracy diffs. Every resample of a batch is one row of a 2-D array, so the
+# work is a handful of numpy calls per batch rather than a python loop per resample
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 0
+# upper bound on resamples * sample size held in memory at once (~32 MB of float64)
+BATCH_ELEMENTS = 1 << 22
+# permutation statistics this close to the observed one count as at least as extreme (float summation noise)
+TIE_TOLERANCE = 1e-9
+
+
+def _batches(resamples: int, size: int) -> Iterator[int]:
+    batch = max(1, BATCH_ELEMENTS // max(size, 1))
+    for done in range(0, resamples, batch):
+        yield min(batch, resamples - done)
+
+
+@timed('analysis.bootstrap')
+def bootstrap_ci(values, statistic: Callable = np.mean, resamples: int = DEFAULT_RESAMPLES,
+                 confidence: float = DEFAULT_CONFIDENCE, seed: Optional[int] = DEFAULT_SEED) -> Dict[str, float]:
+    # percentile bootstrap interval of statistic(values); statistic has to take an axis argument like the numpy
+    # reductions do. NaN bounds when there are no values
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {'estimate': np.nan, 'low': np.nan, 'high': np.nan, 'resamples': 0}
+    rng = np.random.default_rng(seed)
+    estimates = np.empty(resamples)
+    done = 0
+    for batch in _batches(resamples, len(values)):
+        indices = rng.integers(0, len(values), size=(batch, len(values)))
+        estimates[done:done + batch] = statistic(values[indices], axis=1)
+        done += batch
+    metrics.count('analysis.bootstrap_resamples', resamples)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(estimates, [tail, 100 - tail])
+    return {'estimate': float(statistic(values)), 'low': float(low), 'high': float(high), 'resamples': resamples}
+
+
+@timed('analysis.permutation')
+def paired_permutation_test(first, second, resamples: int = DEFAULT_RESAMPLES,
+                            seed: Optional[int] = DEFAULT_SEED) -> Dict[str, float]:
+    # two-sided sign-flip test of a zero mean difference between paired samples (same days, same order). Under
+    # the null each day's difference is as likely to have either sign; when 2**n sign patterns are no more than
+    # `resamples` all of them are enumerated and the p-value is exact
+    differences = np.asarray(first, dtype=float) - np.asarray(second, dtype=float)
+    size = len(differences)
+    if not size:
+        return {'mean_difference': np.nan, 'p_value': np.nan, 'resamples': 0, 'exact': False}
+    observed = abs(differences.mean())
+    exact = size < 63 and 2 ** size <= resamples
+    extreme = 0
+    if exact:
+        resamples = 2 ** size
+        bits = np.arange(size, dtype=np.int64)
+        done = 0
+        for batch in _batches(resamples, size):
+            patterns = np.arange(done, done + batch, dtype=np.int64)[:, None] >> bits & 1
+            extreme += np.count_nonzero(np.abs((1 - 2 * patterns) @ differences) / size >= observed - TIE_TOLERANCE)
+            done += batch
+        p_value = extreme / resamples
+    else:
+        rng = np.random.default_rng(seed)
+        for batch in _batches(resamples, size):
+            signs = np.where(rng.random((batch, size)) < 0.5, -1.0, 1.0)
+            extreme += np.count_nonzero(np.abs(signs @ differences) / size >= observed - TIE_TOLERANCE)
+        # the observed labelling counts as one of the permutations, so p is never 0
+        p_value = (extreme + 1) / (resamples + 1)
+    metrics.count('analysis.permutation_resamples', resamples)
+    return {'mean_difference': float(differences.mean()), 'p_value': float(p_value), 'resamples': resamples,
+            'exact': exact}
@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+SECONDS_PER_DAY = 86_400
+
+# start/end are UTC epoch seconds; the offsets are the UTC offsets (in seconds) in effect at those instants,
+# so local wall-clock time is epoch + offset and nothing about the original timestamp is lost
+SCHEDULE_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('start', 'i8'),
+    ('end', 'i8'),
+    ('start_offset', 'i4'),
+    ('end_offset', 'i4'),
+])
+
+
+class DailySchedule:
+    # per-date (start, end) pair shared by all analyzers, stored as one structured array sorted by date
+    __slots__ = ('records',)
+
+    def __init__(self, records: np.ndarray = None):
+        if records is None:
+            records = np.empty(0, dtype=SCHEDULE_DTYPE)
+        self.records = np.sort(records, order='date')
+
+    @classmethod
+    def from_arrays(cls, dates, starts, ends, start_offsets, end_offsets) -> "DailySchedule":
+        records = np.empty(len(starts), dtype=SCHEDULE_DTYPE)
+        records['date'] = np.asarray(dates, dtype='datetime64[D]')
+        records['start'] = starts
+        records['end'] = ends
+        records['start_offset'] = start_offsets
+        records['end_offset'] = end_offsets
+        return cls(records)
+
+    @classmethod
+    def from_datetimes(cls, items: Iterable[Tuple[str, datetime, datetime]]) -> "DailySchedule":
+        # items are (iso date, aware start, aware end)
+        items = list(items)
+        return cls.from_arrays(
+            [date for date, _, _ in items],
+            [int(start.timestamp()) for _, start, _ in items],
+            [int(end.timestamp()) for _, _, end in items],
+            [int(start.utcoffset().total_seconds()) for _, start, _ in items],
+            [int(end.utcoffset().total_seconds()) for _, _, end in items],
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "DailySchedule(0 days)"
+        return f"DailySchedule({len(self)} days, {self.records['date'][0]} to {self.records['date'][-1]})"
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.records['date']
+
+    def start_hours(self) -> np.ndarray:
+        # local time of day of each start, in fractional hours
+        return ((self.records['start'] + self.records['start_offset']) % SECONDS_PER_DAY) / 3600
+
+    def end_hours(self) -> np.ndarray:
+        return ((self.records['end'] + self.records['end_offset']) % SECONDS_PER_DAY) / 3600
+
+    def merge(self, other: "DailySchedule") -> "DailySchedule":
+        # union by date, keeping the earliest start and the latest end of each date
+        records = np.concatenate((self.records, other.records))
+        if not len(records):
+            return DailySchedule()
+        by_start = records[np.lexsort((records['start'], records['date']))]
+        by_end = records[np.lexsort((records['end'], records['date']))]
+        dates = by_start['date']
+        firsts = np.flatnonzero(np.concatenate(([True], dates[1:] != dates[:-1])))
+        lasts = np.append(firsts[1:], len(dates)) - 1
+
+        merged = by_start[firsts].copy()
+        merged['end'] = by_end['end'][lasts]
+        merged['end_offset'] = by_end['end_offset'][lasts]
+        return DailySchedule(merged)
+
+    def to_dict(self, time_format: str = '%I:%M %p') -> Dict[str, Tuple[str, str]]:
+        # display form, matching what the analyzers used to return
+        def local(seconds, offset):
+            return datetime.utcfromtimestamp(int(seconds) + int(offset)).strftime(time_format)
+
+        return {str(record['date']): (local(record['start'], record['start_offset']),
+                                      local(record['end'], record['end_offset']))
+                for record in self.records}
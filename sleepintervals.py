@@ -0,0 +1,215 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from activitygaps import DEFAULT_ANCHOR_HOUR
+from schedule import SECONDS_PER_DAY, DailySchedule
+
+# sleep analysis values as stage codes; older exports wrote the bare numbers, and iOS 16 split "Asleep" into
+# Core/Deep/REM while keeping it (as AsleepUnspecified) for sources without stage detection
+STAGES = ('in_bed', 'asleep', 'core', 'deep', 'rem', 'awake')
+IN_BED, ASLEEP, CORE, DEEP, REM, AWAKE = range(len(STAGES))
+ASLEEP_STAGES = (ASLEEP, CORE, DEEP, REM)
+STAGE_CODES = {
+    'HKCategoryValueSleepAnalysisInBed': IN_BED,
+    'HKCategoryValueSleepAnalysisAsleep': ASLEEP,
+    'HKCategoryValueSleepAnalysisAsleepUnspecified': ASLEEP,
+    'HKCategoryValueSleepAnalysisAsleepCore': CORE,
+    'HKCategoryValueSleepAnalysisAsleepDeep': DEEP,
+    'HKCategoryValueSleepAnalysisAsleepREM': REM,
+    'HKCategoryValueSleepAnalysisAwake': AWAKE,
+    '0': IN_BED, '1': ASLEEP, '2': AWAKE,
+}
+
+# onset/wake are epoch seconds with the utc offsets in effect there; the other fields are seconds per night
+NIGHT_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('onset', 'i8'),
+    ('wake', 'i8'),
+    ('onset_offset', 'i4'),
+    ('wake_offset', 'i4'),
+    ('asleep', 'i8'),
+    ('in_bed', 'i8'),
+    ('awake', 'i8'),
+    ('core', 'i8'),
+    ('deep', 'i8'),
+    ('rem', 'i8'),
+    ('source', 'i2'),
+])
+
+
+def parse_health_dates(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # vectorized strptime('%Y-%m-%d %H:%M:%S %z') for Health export dates: epoch seconds and utc offsets
+    raw = np.asarray(texts, dtype='S25')
+    if not len(raw):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    local = raw.astype('S19').astype('datetime64[s]').astype(np.int64)
+    digits = raw.view(np.uint8).reshape(-1, 25).astype(np.int32) - ord('0')
+    offsets = (digits[:, 21] * 36000 + digits[:, 22] * 3600 + digits[:, 23] * 600 + digits[:, 24] * 60)
+    offsets = np.where(digits[:, 20] == ord('-') - ord('0'), -offsets, offsets).astype(np.int32)
+    return local - offsets, offsets
+
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray, groups: np.ndarray,
+                    group_count: int) -> np.ndarray:
+    # total length of the union of the [start, end) intervals of each group 0..group_count-1, so overlapping
+    # records are only counted once
+    if not len(starts):
+        return np.zeros(group_count, dtype=np.int64)
+    ends = np.maximum(ends, starts)
+    order = np.lexsort((starts, groups))
+    starts, ends, groups = starts[order], ends[order], groups[order]
+    # shifting each group into its own range lets one running maximum serve every group
+    base = starts.min()
+    span = int(max(ends.max(), starts.max()) - base) + 1
+    shifted_starts = groups * span + (starts - base)
+    reach = np.maximum.accumulate(groups * span + (ends - base))
+    first = np.concatenate(([True], shifted_starts[1:] > reach[:-1]))
+    block_starts = np.flatnonzero(first)
+    block_ends = np.append(block_starts[1:], len(starts)) - 1
+    lengths = reach[block_ends] - shifted_starts[block_starts]
+    return np.bincount(groups[block_starts], weights=lengths, minlength=group_count).astype(np.int64)
+
+
+def _first_per_group(keys: np.ndarray, groups: np.ndarray, last: bool = False) -> np.ndarray:
+    # index of the smallest (or largest) key of each group, groups in ascending order
+    order = np.lexsort((keys, groups))
+    sorted_groups = groups[order]
+    edges = np.concatenate(([True], sorted_groups[1:] != sorted_groups[:-1]))
+    if last:
+        edges = np.append(edges[1:], True)
+    return order[np.flatnonzero(edges)]
+
+
+class SleepIntervals:
+    # every sleep analysis record as parallel arrays: start/end epoch seconds, start utc offset, stage code
+    # (index into STAGES, -1 for unknown values) and source (index into source_names)
+    __slots__ = ('starts', 'ends', 'offsets', 'end_offsets', 'stages', 'sources', 'source_names')
+
+    def __init__(self, starts, ends, offsets, end_offsets, stages, sources, source_names: List[str]):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.end_offsets = np.asarray(end_offsets, dtype=np.int32)
+        self.stages = np.asarray(stages, dtype=np.int8)
+        self.sources = np.asarray(sources, dtype=np.int16)
+        self.source_names = source_names
+
+    @classmethod
+    def from_records(cls, start_dates: Sequence[str], end_dates: Sequence[str], values: Sequence[str],
+                     source_names: Sequence[str]) -> "SleepIntervals":
+        # from the raw attribute strings of the records
+        starts, offsets = parse_health_dates(start_dates)
+        ends, end_offsets = parse_health_dates(end_dates)
+        names: Dict[str, int] = {}
+        sources = [names.setdefault(name, len(names)) for name in source_names]
+        stages = [STAGE_CODES.get(value, -1) for value in values]
+        return cls(starts, ends, offsets, end_offsets, stages, sources, list(names))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __repr__(self) -> str:
+        return f"SleepIntervals({len(self)} records, {len(self.source_names)} sources)"
+
+    def select(self, mask: np.ndarray) -> "SleepIntervals":
+        return SleepIntervals(self.starts[mask], self.ends[mask], self.offsets[mask], self.end_offsets[mask],
+                              self.stages[mask], self.sources[mask], self.source_names)
+
+    def deduplicated(self) -> "SleepIntervals":
+        # drops records repeated with the same source, stage, start and end (re-synced or re-imported samples)
+        keys = np.rec.fromarrays([self.sources, self.stages, self.starts, self.ends])
+        _, first = np.unique(keys, return_index=True)
+        return self.select(np.sort(first))
+
+    def localized(self, table) -> "SleepIntervals":
+        # the same records with their utc offsets taken from an OffsetTable instead of the export
+        return SleepIntervals(self.starts, self.ends, table.offsets_at(self.starts), table.offsets_at(self.ends),
+                              self.stages, self.sources, self.source_names)
+
+    def daily_schedule(self) -> DailySchedule:
+        # earliest start and latest end of the records starting on each local date, as parse_xml buckets them
+        if not len(self):
+            return DailySchedule()
+        days = (self.starts + self.offsets) // SECONDS_PER_DAY
+        earliest = _first_per_group(self.starts, days)
+        latest = _first_per_group(self.ends, days, last=True)
+        return DailySchedule.from_arrays(days[earliest].astype('datetime64[D]'), self.starts[earliest],
+                                         self.ends[latest], self.offsets[earliest], self.end_offsets[latest])
+
+    def nights(self, anchor_hour: float = DEFAULT_ANCHOR_HOUR) -> "SleepNights":
+        # one row per night (the local window starting at anchor_hour on its date). For each night the source
+        # with the most asleep records is taken for the stages, so a Watch and a phone app don't both count;
+        # overlapping records of a stage are merged before summing. Onset/wake are the first asleep start and
+        # last asleep end of that source, or the in-bed span when nothing was recorded as asleep
+        intervals = self.deduplicated()
+        if not len(intervals):
+            return SleepNights(np.empty(0, dtype=NIGHT_DTYPE), self.source_names)
+        windows = (intervals.starts + intervals.offsets - int(anchor_hour * 3600)) // SECONDS_PER_DAY
+        dates, nights = np.unique(windows, return_inverse=True)
+        night_count = len(dates)
+        source_count = max(len(self.source_names), 1)
+
+        asleep = np.isin(intervals.stages, ASLEEP_STAGES)
+        pairs, counts = np.unique(nights[asleep] * source_count + intervals.sources[asleep], return_counts=True)
+        best = _first_per_group(counts, pairs // source_count, last=True)
+        chosen_source = np.full(night_count, -1, dtype=np.int64)
+        chosen_source[pairs[best] // source_count] = pairs[best] % source_count
+        chosen = intervals.sources == chosen_source[nights]
+
+        records = np.zeros(night_count, dtype=NIGHT_DTYPE)
+        records['date'] = dates.astype('datetime64[D]')
+        records['source'] = chosen_source
+
+        def total(mask):
+            return merge_intervals(intervals.starts[mask], intervals.ends[mask], nights[mask], night_count)
+
+        records['asleep'] = total(asleep & chosen)
+        records['awake'] = total((intervals.stages == AWAKE) & chosen)
+        records['core'] = total((intervals.stages == CORE) & chosen)
+        records['deep'] = total((intervals.stages == DEEP) & chosen)
+        records['rem'] = total((intervals.stages == REM) & chosen)
+        records['in_bed'] = total(intervals.stages == IN_BED)
+
+        # in-bed bounds first, then overwritten by the asleep bounds wherever there are any
+        for mask in (intervals.stages == IN_BED, asleep & chosen):
+            index = np.flatnonzero(mask)
+            if not len(index):
+                continue
+            onsets = index[_first_per_group(intervals.starts[index], nights[index])]
+            wakes = index[_first_per_group(intervals.ends[index], nights[index], last=True)]
+            records['onset'][nights[onsets]] = intervals.starts[onsets]
+            records['onset_offset'][nights[onsets]] = intervals.offsets[onsets]
+            records['wake'][nights[wakes]] = intervals.ends[wakes]
+            records['wake_offset'][nights[wakes]] = intervals.end_offsets[wakes]
+
+        # nights with nothing but awake or unknown records have no bounds
+        has_bounds = np.zeros(night_count, dtype=bool)
+        has_bounds[nights[(intervals.stages == IN_BED) | asleep]] = True
+        return SleepNights(records[has_bounds], self.source_names)
+
+
+class SleepNights:
+    # per-night summary built by SleepIntervals.nights, sorted by date
+    __slots__ = ('records', 'source_names')
+
+    def __init__(self, records: np.ndarray, source_names: List[str]):
+        self.records = records
+        self.source_names = source_names
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "SleepNights(0 nights)"
+        return f"SleepNights({len(self)} nights, {self.records['date'][0]} to {self.records['date'][-1]})"
+
+    def schedule(self) -> DailySchedule:
+        # onset/wake as a DailySchedule, for aligning with the other sources
+        records = self.records
+        return DailySchedule.from_arrays(records['date'], records['onset'], records['wake'],
+                                         records['onset_offset'], records['wake_offset'])
+
+    def asleep_hours(self) -> np.ndarray:
+        return self.records['asleep'] / 3600
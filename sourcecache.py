@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+
+from instrumentation import metrics
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sleeptracker")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+FINGERPRINT_KEY = "__fingerprint__"
+
+
+class SourceCache:
+    # stores the arrays an analyzer extracted from an export as a compressed .npz file, one entry per
+    # (kind, source path), valid only while the source's path/size/mtime (and optionally content hash) match
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 content_hash: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+        self._hashes: Dict[tuple, str] = {}
+
+    def fingerprint(self, path: str) -> str:
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        fingerprint = f"{real_path}|{stat.st_size}|{stat.st_mtime_ns}"
+        if self.content_hash:
+            key = (real_path, stat.st_size, stat.st_mtime_ns)
+            if key not in self._hashes:
+                digest = hashlib.sha256()
+                with open(real_path, "rb") as file:
+                    for block in iter(lambda: file.read(1024 * 1024), b""):
+                        digest.update(block)
+                self._hashes[key] = digest.hexdigest()
+            fingerprint += "|" + self._hashes[key]
+        return fingerprint
+
+    def _path_key(self, path: str) -> str:
+        return hashlib.sha1(os.path.realpath(path).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, kind: str, path: str) -> str:
+        return os.path.join(self.cache_dir, f"{kind}-{self._path_key(path)}.npz")
+
+    def load(self, kind: str, path: str) -> Optional[Dict[str, np.ndarray]]:
+        entry_path = self._entry_path(kind, path)
+        try:
+            with np.load(entry_path, allow_pickle=False) as data:
+                if str(data[FINGERPRINT_KEY]) != self.fingerprint(path):
+                    metrics.count(f"cache.{kind}.misses")
+                    return None
+                arrays = {name: data[name] for name in data.files if name != FINGERPRINT_KEY}
+        except (OSError, ValueError, KeyError):
+            metrics.count(f"cache.{kind}.misses")
+            return None
+        # mtime doubles as the LRU timestamp; another process may have evicted the entry since it was read
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+        metrics.count(f"cache.{kind}.hits")
+        return arrays
+
+    def store(self, kind: str, path: str, **arrays: np.ndarray) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arrays[FINGERPRINT_KEY] = np.array(self.fingerprint(path))
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez_compressed(file, **arrays)
+            os.replace(tmp_path, self._entry_path(kind, path))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._evict()
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        # drops every entry for `path`, or the whole cache when no path is given
+        if not os.path.isdir(self.cache_dir):
+            return
+        suffix = f"-{self._path_key(path)}.npz" if path is not None else ".npz"
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(suffix):
+                self._remove(name)
+
+    def _remove(self, name: str) -> None:
+        # the cache directory is shared by worker processes, so an entry can disappear between listing and removal
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(name)
+            total -= size
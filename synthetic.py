@@ -0,0 +1,184 @@
+import json
+import math
+import random
+from itertools import islice
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# deterministic generators for Takeout-style watch-history.html, Chrome BrowserHistory.json and Apple Health
+# export.xml of roughly a requested size; every file is written streaming, so multi-GB outputs are fine
+
+DEFAULT_END = datetime(2025, 8, 1)
+DEFAULT_DAYS = 3 * 365
+DEFAULT_ZONE = "America/New_York"
+
+# rough bytes per record of each format, only used to spread a target size over DEFAULT_DAYS
+YOUTUBE_RECORD_BYTES = 850
+CHROME_RECORD_BYTES = 300
+APPLE_SLEEP_RECORD_BYTES = 260
+APPLE_HEART_RATE_RECORD_BYTES = 330
+APPLE_SLEEP_RECORDS_PER_NIGHT = 11
+
+YOUTUBE_HEADER = ('<html><head><meta charset="UTF-8"><style type="text/css">.mdl-grid {}</style></head>'
+                  '<body><div class="mdl-grid">\n')
+YOUTUBE_FOOTER = '</div></body></html>\n'
+YOUTUBE_RECORD = (
+    '<div class="outer-cell mdl-cell mdl-cell--12-col mdl-shadow--2dp"><div class="mdl-grid">'
+    '<div class="header-cell mdl-cell mdl-cell--12-col"><p class="mdl-typography--title">YouTube<br></p></div>'
+    '<div class="content-cell mdl-cell mdl-cell--6-col mdl-typography--body-1">Watched\u00a0'
+    '<a href="https://www.youtube.com/watch?v={video}">{title}</a><br>'
+    '<a href="https://www.youtube.com/channel/{channel}">{channel_name}</a><br>{stamp}</div>'
+    '<div class="content-cell mdl-cell mdl-cell--6-col mdl-typography--body-1 mdl-typography--text-right"></div>'
+    '<div class="content-cell mdl-cell mdl-cell--12-col mdl-typography--caption"><b>Products:</b><br>'
+    '\u2003YouTube<br><b>Why is this here?</b><br>\u2003This activity was saved to your Google Account '
+    'because the following settings were on:\u00a0YouTube watch history.<br></div></div></div>\n'
+)
+
+CHROME_TITLES = ("YouTube", "Google Search", "Inbox (3) - Gmail", "Stack Overflow", "Wikipedia", "News & Weather",
+                 "Python documentation", "Reddit - \"front page\"", "GitHub", "Maps")
+
+SLEEP_STAGES = ("HKCategoryValueSleepAnalysisAsleepCore", "HKCategoryValueSleepAnalysisAsleepDeep",
+                "HKCategoryValueSleepAnalysisAsleepREM", "HKCategoryValueSleepAnalysisAwake")
+
+
+def parse_size(text):
+    # "1MB", "250kb", "10GB" or a plain byte count
+    text = text.strip().upper()
+    for suffix, factor in (("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+
+def _per_day(size_bytes, record_bytes, days):
+    return max(1, math.ceil(size_bytes / (record_bytes * days)))
+
+
+def _waking_days(rng, end, zone):
+    # walks backwards from `end` yielding (wake, sleep) local datetimes for each day; bedtime drifts past
+    # midnight now and then, like a real schedule
+    day = datetime(end.year, end.month, end.day)
+    while True:
+        wake = day + timedelta(hours=7, minutes=rng.gauss(30, 45))
+        sleep = day + timedelta(hours=23, minutes=rng.gauss(30, 60))
+        yield wake.replace(tzinfo=zone), sleep.replace(tzinfo=zone)
+        day -= timedelta(days=1)
+
+
+def _events(rng, size_bytes, record_bytes, days, end, zone):
+    # newest-first aware event times, `per_day` of them spread over each waking window
+    per_day = _per_day(size_bytes, record_bytes, days)
+    for wake, sleep in _waking_days(rng, end, zone):
+        span = (sleep - wake).total_seconds()
+        offsets = sorted((rng.random() * span for _ in range(per_day)), reverse=True)
+        for offset in offsets:
+            yield wake + timedelta(seconds=offset)
+
+
+def _stamp(dt):
+    local = dt.astimezone(dt.tzinfo)
+    hour = local.hour % 12 or 12
+    return f"{local:%b} {local.day}, {local.year}, {hour}:{local:%M:%S}\u202f{local:%p} {local.tzname()}"
+
+
+def write_youtube_history(path, size_bytes, seed=0, days=DEFAULT_DAYS, end=DEFAULT_END, zone=DEFAULT_ZONE):
+    rng = random.Random(seed)
+    records = 0
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(YOUTUBE_HEADER)
+        written = len(YOUTUBE_HEADER)
+        for dt in _events(rng, size_bytes, YOUTUBE_RECORD_BYTES, days, end, ZoneInfo(zone)):
+            if written >= size_bytes:
+                break
+            video = rng.getrandbits(48)
+            record = YOUTUBE_RECORD.format(video=f"{video:012x}", title=f"Video {video % 100000} &amp; more",
+                                           channel=f"UC{video % 977:06d}", channel_name=f"Channel {video % 977}",
+                                           stamp=_stamp(dt))
+            file.write(record)
+            written += len(record.encode("utf-8"))
+            records += 1
+        file.write(YOUTUBE_FOOTER)
+    return records
+
+
+def write_browser_history(path, size_bytes, seed=0, days=DEFAULT_DAYS, end=DEFAULT_END, zone=DEFAULT_ZONE):
+    rng = random.Random(seed)
+    records = 0
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('{\n    "Browser History": [')
+        written = 0
+        for dt in _events(rng, size_bytes, CHROME_RECORD_BYTES, days, end, ZoneInfo(zone)):
+            if written >= size_bytes:
+                break
+            page = rng.getrandbits(32)
+            record = {
+                "favicon_url": "https://www.example.com/favicon.ico",
+                "page_transition": rng.choice(("LINK", "TYPED", "RELOAD", "AUTO_BOOKMARK")),
+                "title": f"{rng.choice(CHROME_TITLES)} {page % 1000}",
+                "url": f"https://www.example.com/{page:08x}",
+                "client_id": "c2xlZXB0cmFja2VyLXN5bnRoZXRpYw==",
+                "time_usec": int(dt.timestamp() * 1_000_000) + rng.randrange(1_000_000),
+            }
+            text = ("," if records else "") + "\n        " + json.dumps(record, indent=4).replace("\n", "\n        ")
+            file.write(text)
+            written += len(text)
+            records += 1
+        file.write('\n    ]\n}\n')
+    return records
+
+
+def _health_date(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S %z")
+
+
+def write_apple_health(path, size_bytes, seed=0, days=DEFAULT_DAYS, end=DEFAULT_END, zone=DEFAULT_ZONE):
+    # oldest-first like a real export: per night an iPhone InBed record plus Watch stage records, with enough
+    # heart-rate records around them to land near the target size (the night count is estimated up front so
+    # the newest night always ends at `end`)
+    rng = random.Random(seed)
+    tz = ZoneInfo(zone)
+    sleep_bytes = APPLE_SLEEP_RECORD_BYTES * APPLE_SLEEP_RECORDS_PER_NIGHT
+    filler_per_day = max(0, math.ceil((size_bytes / days - sleep_bytes) / APPLE_HEART_RATE_RECORD_BYTES))
+    # take only as many nights as the size needs, then write them oldest first
+    needed = max(1, round(size_bytes / (sleep_bytes + APPLE_HEART_RATE_RECORD_BYTES * filler_per_day)))
+    waking = list(islice(_waking_days(rng, end, tz), needed + 1))
+    nights = [(waking[i + 1][1], waking[i][0]) for i in range(needed)]
+    records = 0
+    with open(path, "w", encoding="utf-8") as file:
+        header = ('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE HealthData [\n<!ELEMENT HealthData (ExportDate,Me,(Record|Workout)*)>\n]>\n'
+                  '<HealthData locale="en_US">\n'
+                  f' <ExportDate value="{_health_date(end.replace(tzinfo=tz))}"/>\n'
+                  ' <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-01-01"/>\n')
+        file.write(header)
+        for onset, wake in reversed(nights):
+            lines = [_sleep_record("iPhone", onset - timedelta(minutes=15), wake + timedelta(minutes=10),
+                                   "HKCategoryValueSleepAnalysisInBed")]
+            stage_start = onset
+            while stage_start < wake:
+                stage_end = min(wake, stage_start + timedelta(minutes=rng.randint(10, 90)))
+                lines.append(_sleep_record("Apple Watch", stage_start, stage_end, rng.choice(SLEEP_STAGES)))
+                stage_start = stage_end
+            for _ in range(filler_per_day):
+                at = wake + timedelta(seconds=rng.random() * 15 * 3600)
+                lines.append(f' <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Apple Watch" '
+                             f'unit="count/min" creationDate="{_health_date(at)}" startDate="{_health_date(at)}" '
+                             f'endDate="{_health_date(at)}" value="{rng.randint(50, 120)}">\n'
+                             f'  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n </Record>\n')
+            text = "".join(lines)
+            file.write(text)
+            records += len(lines)
+        file.write('</HealthData>\n')
+    return records
+
+
+def _sleep_record(source, start, end, value):
+    return (f' <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="{source}" sourceVersion="1" '
+            f'creationDate="{_health_date(end)}" startDate="{_health_date(start)}" endDate="{_health_date(end)}" '
+            f'value="{value}"/>\n')
+
+
+GENERATORS = {
+    "youtube": ("watch-history.html", write_youtube_history),
+    "chrome": ("BrowserHistory.json", write_browser_history),
+    "apple": ("export.xml", write_apple_health),
+}
@@ -0,0 +1,63 @@
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+from activitygaps import ActivityTimeline
+
+OFFSET = 3600
+
+
+def _times(*local):
+    # epoch seconds of local wall-clock times in a zone OFFSET east of UTC
+    return [calendar.timegm(datetime.fromisoformat(text).timetuple()) - OFFSET for text in local]
+
+
+def _timeline(*local):
+    times = _times(*local)
+    return ActivityTimeline(np.array(times), np.full(len(times), OFFSET))
+
+
+def _nights(schedule):
+    return [(str(record['date']), int(record['start']), int(record['end'])) for record in schedule.records]
+
+
+def test_no_activity_has_no_nights():
+    assert len(ActivityTimeline().sleep_schedule()) == 0
+    assert len(_timeline("2024-03-01T09:00").sleep_schedule()) == 0
+    assert len(ActivityTimeline.combine().sleep_schedule()) == 0
+
+
+def test_activity_past_midnight_stays_with_the_evening_it_started():
+    # awake with activity every few hours, then asleep from 00:45 and from 22:15
+    timeline = _timeline("2024-03-01T09:00", "2024-03-01T12:00", "2024-03-01T15:00", "2024-03-01T18:30",
+                         "2024-03-01T21:00", "2024-03-01T23:30", "2024-03-02T00:45",
+                         "2024-03-02T07:30", "2024-03-02T10:00", "2024-03-02T13:00", "2024-03-02T16:00",
+                         "2024-03-02T19:00", "2024-03-02T22:15",
+                         "2024-03-03T06:45")
+    start, end, second_start, second_end = _times("2024-03-02T00:45", "2024-03-02T07:30",
+                                                  "2024-03-02T22:15", "2024-03-03T06:45")
+    assert _nights(timeline.sleep_schedule()) == [("2024-03-01", start, end), ("2024-03-02", second_start, second_end)]
+    schedule = timeline.sleep_schedule()
+    assert schedule.records['start_offset'].tolist() == [OFFSET, OFFSET]
+    # windows starting at midnight put both gaps on March 2nd, and only the longer one is kept
+    assert _nights(timeline.sleep_schedule(anchor_hour=0)) == [("2024-03-02", second_start, second_end)]
+
+
+def test_implausible_gaps_are_left_out():
+    # activity every three hours all night has no gap long enough; three silent days are missing data
+    restless = _timeline(*[f"2024-03-01T{hour:02d}:00" for hour in range(9, 24, 3)],
+                         *[f"2024-03-02T{hour:02d}:00" for hour in range(0, 18, 3)],
+                         "2024-03-05T08:00")
+    assert len(restless.sleep_schedule()) == 0
+    start, end = _times("2024-03-02T15:00", "2024-03-05T08:00")
+    assert _nights(restless.sleep_schedule(max_gap_hours=72)) == [("2024-03-01", start, end)]
+
+
+def test_sources_are_combined_in_time_order():
+    youtube = _times("2024-03-01T22:00", "2024-03-02T08:00")
+    chrome = _times("2024-03-01T23:50", "2024-03-02T07:10")
+    timeline = ActivityTimeline.combine((np.array(youtube), np.full(2, OFFSET)), _timeline("2024-03-01T19:00"),
+                                        (np.array(chrome), np.full(2, OFFSET)))
+    assert timeline.times.tolist() == sorted(timeline.times.tolist())
+    assert _nights(timeline.sleep_schedule()) == [("2024-03-01", chrome[0], chrome[1])]
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from applehealthanalyzer import AppleHealthAnalyzer
+from instrumentation import metrics
+from synthetic import write_apple_health
+
+STEP_RECORD = ('<Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" '
+               'startDate="2024-05-{day:02d} 10:00:00 -0400" endDate="2024-05-{day:02d} 10:05:00 -0400" value="100"/>\n')
+
+
+@pytest.fixture(scope="module")
+def export_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("apple") / "export.xml"
+    write_apple_health(str(path), 300 * 1024, seed=5)
+    text = path.read_text(encoding="utf-8")
+    first = text.index("<Record")
+    steps = "".join(STEP_RECORD.format(day=day) for day in range(1, 11))
+    path.write_text(text[:first] + steps + text[first:], encoding="utf-8")
+    return str(path)
+
+
+def test_streaming_matches_tree_parse(export_path):
+    tree = AppleHealthAnalyzer(export_path).analyze()
+    streamed = AppleHealthAnalyzer(export_path, streaming=True).analyze()
+    assert len(tree) > 0
+    assert (tree.records == streamed.records).all()
+
+
+def _isoformat(schedule):
+    return {date: (start.isoformat(), end.isoformat()) for date, (start, end) in schedule.items()}
+
+
+def test_intervals_daily_schedule_matches_streaming(export_path):
+    streaming = AppleHealthAnalyzer(export_path, streaming=True)
+    streamed = streaming.analyze()
+    intervals = AppleHealthAnalyzer(export_path)
+    assert (intervals.load_intervals().daily_schedule().records == streamed.records).all()
+    assert (intervals.analyze_intervals().records == streamed.records).all()
+    assert _isoformat(intervals.schedule) == _isoformat(streaming.schedule)
+    assert intervals.high_water_mark == streaming.high_water_mark
+
+
+def test_activity_times_reads_only_the_requested_records(export_path):
+    times, offsets = AppleHealthAnalyzer(export_path).activity_times()
+    assert len(times) == 10
+    assert set(offsets.tolist()) == {-4 * 3600}
+
+
+def test_activity_and_sleep_records_share_one_counted_pass(export_path):
+    metrics.enabled = True
+    metrics.reset()
+    try:
+        analyzer = AppleHealthAnalyzer(export_path)
+        analyzer.activity_times()
+        intervals = analyzer.load_intervals()
+        counters = dict(metrics.counters)
+    finally:
+        metrics.enabled = False
+        metrics.reset()
+    assert counters['apple.bytes_read'] == os.path.getsize(export_path)
+    assert counters['apple.records_seen'] == len(intervals) + 10
+    assert (intervals.starts == AppleHealthAnalyzer(export_path).load_intervals().starts).all()
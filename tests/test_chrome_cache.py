@@ -0,0 +1,51 @@
+import pytest
+
+from browserhistoryanalyzer import DAILY_TIMESTAMPS_CUTOFF_USEC, BrowserHistoryAnalyzer
+from sourcecache import SourceCache
+from synthetic import write_browser_history
+
+
+@pytest.fixture(scope="module")
+def history_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("chrome") / "BrowserHistory.json"
+    write_browser_history(str(path), 200 * 1024, seed=7)
+    return str(path)
+
+
+def _counting_analyzer(path, cache, scans):
+    analyzer = BrowserHistoryAnalyzer(path, cache=cache)
+    scan = analyzer.scan
+
+    def counted(*args, **kwargs):
+        scans.append(kwargs.get('start'))
+        return scan(*args, **kwargs)
+
+    analyzer.scan = counted
+    return analyzer
+
+
+def test_bounded_and_unbounded_loads_keep_their_entries(history_path, tmp_path):
+    # analyze_all always scans and stores the bounded times; it must not evict the whole history event_times
+    # cached, nor the other way round
+    cache = SourceCache(str(tmp_path / "cache"))
+    scans = []
+    _counting_analyzer(history_path, cache, scans).analyze_all(DAILY_TIMESTAMPS_CUTOFF_USEC)
+    everything = _counting_analyzer(history_path, cache, scans).load_times()
+    _counting_analyzer(history_path, cache, scans).analyze_all(DAILY_TIMESTAMPS_CUTOFF_USEC)
+    assert len(scans) == 3
+
+    bounded = _counting_analyzer(history_path, cache, scans).load_times(DAILY_TIMESTAMPS_CUTOFF_USEC)
+    assert (_counting_analyzer(history_path, cache, scans).load_times() == everything).all()
+    assert len(scans) == 3
+    assert (everything[everything >= DAILY_TIMESTAMPS_CUTOFF_USEC] == bounded).all()
+
+
+def test_bounded_entry_serves_later_starts_only(history_path, tmp_path):
+    cache = SourceCache(str(tmp_path / "cache"))
+    scans = []
+    first = _counting_analyzer(history_path, cache, scans).load_times(DAILY_TIMESTAMPS_CUTOFF_USEC)
+    later = DAILY_TIMESTAMPS_CUTOFF_USEC + 86_400 * 1_000_000
+    assert (_counting_analyzer(history_path, cache, scans).load_times(later) == first[first >= later]).all()
+    assert len(scans) == 1
+    _counting_analyzer(history_path, cache, scans).load_times(DAILY_TIMESTAMPS_CUTOFF_USEC - 1)
+    assert len(scans) == 2
@@ -0,0 +1,106 @@
+import json
+import random
+
+import pytest
+
+from browserhistoryanalyzer import DAILY_TIMESTAMPS_CUTOFF_USEC, BrowserHistoryAnalyzer
+from instrumentation import metrics
+from synthetic import write_browser_history
+
+
+def _write_history(path, times):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"Browser History": [{"title": f"page {number}", "time_usec": time_usec}
+                                       for number, time_usec in enumerate(times)]}, file)
+    return str(path)
+
+
+def _query(path, order, start, end):
+    analyzer = BrowserHistoryAnalyzer(path, order=order)
+    return [record["time_usec"] for record in analyzer.query(start, end)]
+
+
+@pytest.fixture
+def counted():
+    metrics.enabled = True
+    metrics.reset()
+    yield metrics.counters
+    metrics.enabled = False
+    metrics.reset()
+
+
+@pytest.mark.parametrize("times", [
+    # the first record is already before the window
+    [5, 40, 10, 30, 20, 50],
+    # in order at first, then not
+    [50, 40, 5, 30, 20, 10],
+    # sorted the other way round
+    [5, 10, 20, 30, 40, 50],
+])
+def test_wrong_declared_order_falls_back_to_a_full_scan(tmp_path, counted, times):
+    path = _write_history(tmp_path / "history.json", times)
+    expected = [time_usec for time_usec in times if 10 <= time_usec < 45]
+    assert _query(path, "newest_first", 10, 45) == expected
+    assert _query(path, None, 10, 45) == expected
+    assert counted["chrome.order_fallbacks"] == 1
+
+
+def test_declared_order_stops_after_the_window(tmp_path, counted):
+    times = list(range(100, 0, -1))
+    path = _write_history(tmp_path / "history.json", times)
+    assert _query(path, "newest_first", 60, 90) == list(range(89, 59, -1))
+    # the records up to the window's end, the one past its start and the one confirming the order
+    assert counted["chrome.records_seen"] == 43
+    assert "chrome.order_fallbacks" not in counted
+    assert _query(path, "oldest_first", 60, 90) == list(range(89, 59, -1))
+    assert counted["chrome.order_fallbacks"] == 1
+
+
+@pytest.fixture(scope="module")
+def shuffled_path(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("shuffled")
+    write_browser_history(str(directory / "sorted.json"), 200 * 1024, seed=9)
+    with open(directory / "sorted.json", encoding="utf-8") as file:
+        history = json.load(file)
+    random.Random(9).shuffle(history["Browser History"])
+    path = directory / "BrowserHistory.json"
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(history, file)
+    return str(path)
+
+
+@pytest.mark.parametrize("timezone", ["US/Eastern", "Europe/Berlin"])
+def test_vectorized_daily_bounds_match_the_per_record_path(shuffled_path, timezone):
+    assert BrowserHistoryAnalyzer(shuffled_path).detect_order() == "unsorted"
+    vectorized = BrowserHistoryAnalyzer(shuffled_path, timezone).process_daily_timestamps()
+    per_record = BrowserHistoryAnalyzer(shuffled_path, timezone).process_daily_timestamps(vectorized=False)
+    assert len(vectorized) > 0
+    assert (vectorized.records == per_record.records).all()
+
+
+@pytest.fixture(scope="module")
+def sorted_path(shuffled_path):
+    return shuffled_path.replace("BrowserHistory.json", "sorted.json")
+
+
+@pytest.mark.parametrize("name,order", [("sorted", "newest_first"), ("sorted", None), ("shuffled", None)])
+def test_projection_matches_whole_records(request, name, order):
+    # a declared order streams bounded queries through the projection; otherwise they seek through the index,
+    # which parses whole records either way. Records may hold more than the fields asked for
+    path = request.getfixturevalue(f"{name}_path")
+    projected = BrowserHistoryAnalyzer(path, order=order, projection=True)
+    items = BrowserHistoryAnalyzer(path, order=order, projection=False)
+    fields = ('time_usec', 'title')
+    start = DAILY_TIMESTAMPS_CUTOFF_USEC
+    for query in ({}, {'start': start}, {'start': start, 'end': start + 30 * 86_400 * 1_000_000}):
+        expected = [{field: record[field] for field in fields} for record in items.query(fields=fields, **query)]
+        assert [{field: record[field] for field in fields}
+                for record in projected.query(fields=fields, **query)] == expected
+        assert len(expected) > 0
+
+    projected.analyze_all(start)
+    items.analyze_all(start)
+    assert projected.daily_patterns == items.daily_patterns
+    assert projected.titles == items.titles
+    assert projected.last_sites == items.last_sites
+    assert (projected.daily_timestamps.records == items.daily_timestamps.records).all()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq  # noqa: E402
+
+from export import SCHEMA_VERSION, export, schemas  # noqa: E402
+from schedule import DailySchedule  # noqa: E402
+from sleepintervals import SleepIntervals  # noqa: E402
+
+DAY = 86_400
+START = 1_700_000_000
+
+
+@pytest.fixture
+def parts():
+    events = {'youtube': (np.array([START, START + 60]), np.array([-18000, -18000])),
+              'chrome': (np.array([START + 30]), np.array([3600]))}
+    schedules = {'apple': DailySchedule.from_arrays(['2023-11-14', '2023-11-15'], [START, START + DAY],
+                                                    [START + 28_800, START + DAY + 27_000], [-18000, -18000],
+                                                    [-18000, -14400]),
+                 'youtube': DailySchedule()}
+    accuracy = {'youtube': pd.Series([0.5, -1.25], index=pd.DatetimeIndex(['2023-11-14', '2023-11-15'], name='date')),
+                'chrome': pd.Series(dtype=float, index=pd.DatetimeIndex([], name='date'))}
+    intervals = SleepIntervals([START, START + 600], [START + 600, START + 1200], [-18000, -18000], [-18000, -18000],
+                               [0, -1], [0, 1], ['iPhone', 'Apple Watch'])
+    return events, schedules, accuracy, intervals
+
+
+def _read(path, export_format):
+    if export_format == 'parquet':
+        return pq.read_table(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+@pytest.mark.parametrize("export_format,compression", [("parquet", "zstd"), ("arrow", "lz4"), ("arrow", "none")])
+def test_round_trip(tmp_path, parts, export_format, compression):
+    events, schedules, accuracy, intervals = parts
+    paths = export(str(tmp_path), export_format, compression, events=events, schedules=schedules,
+                   accuracy=accuracy, intervals=intervals)
+    assert sorted(paths) == ['accuracy', 'events', 'schedules', 'sleep_records']
+
+    tables = {name: _read(path, export_format) for name, path in paths.items()}
+    for name, table in tables.items():
+        assert table.schema.equals(schemas()[name], check_metadata=True)
+        assert table.schema.metadata[b'sleeptracker.table'] == name.encode()
+        assert table.schema.metadata[b'sleeptracker.schema_version'] == str(SCHEMA_VERSION).encode()
+
+    events_table = tables['events'].to_pydict()
+    assert events_table['source'] == ['youtube', 'youtube', 'chrome']
+    assert [int(time.timestamp()) for time in events_table['time']] == [START, START + 60, START + 30]
+    assert events_table['utc_offset'] == [-18000, -18000, 3600]
+
+    schedules_table = tables['schedules']
+    assert schedules_table.column('source').to_pylist() == ['apple', 'apple']
+    assert [str(date) for date in schedules_table.column('date').to_pylist()] == ['2023-11-14', '2023-11-15']
+    assert schedules_table.column('end_offset').to_pylist() == [-18000, -14400]
+    assert schedules_table.column('start_hour').to_pylist() == pytest.approx(
+        schedules['apple'].start_hours().tolist())
+
+    accuracy_table = tables['accuracy'].to_pydict()
+    assert accuracy_table['source'] == ['youtube', 'youtube']
+    assert accuracy_table['diff_hours'] == [0.5, -1.25]
+
+    records = tables['sleep_records'].to_pydict()
+    assert records['stage'] == ['in_bed', None]
+    assert records['source_name'] == ['iPhone', 'Apple Watch']
+    assert [int(end.timestamp()) for end in records['end']] == [START + 600, START + 1200]
+
+
+def test_only_the_given_parts_are_written(tmp_path, parts):
+    events = parts[0]
+    paths = export(str(tmp_path), events=events)
+    assert list(paths) == ['events']
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['events.parquet']
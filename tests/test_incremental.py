@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import analyzer
+from incremental import ScheduleStore
+from synthetic import (YOUTUBE_FOOTER, YOUTUBE_HEADER, write_apple_health, write_browser_history,
+                       write_youtube_history)
+
+# newest records dropped to make the older export; not a whole number of days, so the day the older export
+# ends on is completed by the newer one
+DROPPED_EVENTS = 25
+DROPPED_NIGHTS = 3
+
+
+def _older_youtube(text):
+    # newest first
+    records = text[len(YOUTUBE_HEADER):-len(YOUTUBE_FOOTER)].split('<div class="outer-cell')[1:]
+    return YOUTUBE_HEADER + "".join('<div class="outer-cell' + record
+                                    for record in records[DROPPED_EVENTS:]) + YOUTUBE_FOOTER
+
+
+def _older_chrome(text):
+    # newest first
+    history = json.loads(text)
+    history["Browser History"] = history["Browser History"][DROPPED_EVENTS:]
+    return json.dumps(history, indent=4)
+
+
+def _older_apple(text):
+    # oldest first, each night starting with its in-bed record
+    cut = text.rindex("\n", 0, text.rindex("HKCategoryValueSleepAnalysisInBed", 0, len(text)))
+    for _ in range(DROPPED_NIGHTS - 1):
+        cut = text.rindex("\n", 0, text.rindex("HKCategoryValueSleepAnalysisInBed", 0, cut))
+    return text[:cut + 1] + "</HealthData>\n"
+
+
+OLDER = {'youtube': _older_youtube, 'chrome': _older_chrome, 'apple': _older_apple}
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("exports")
+    newer = {'youtube': directory / "watch-history.html", 'chrome': directory / "BrowserHistory.json",
+             'apple': directory / "export.xml"}
+    write_youtube_history(str(newer['youtube']), 100 * 1024, seed=11, days=60)
+    write_browser_history(str(newer['chrome']), 100 * 1024, seed=12, days=60)
+    write_apple_health(str(newer['apple']), 100 * 1024, seed=13, days=60)
+    older = {}
+    for source, path in newer.items():
+        older[source] = directory / f"older-{path.name}"
+        older[source].write_text(OLDER[source](path.read_text(encoding="utf-8")), encoding="utf-8")
+    return {source: str(path) for source, path in older.items()}, {source: str(path) for source, path in newer.items()}
+
+
+@pytest.mark.parametrize("timezone", [None, "Europe/Berlin"])
+@pytest.mark.parametrize("source", analyzer.SOURCES)
+def test_older_then_newer_export_equals_one_full_run(exports, tmp_path, source, timezone):
+    older, newer = exports
+    full_store = ScheduleStore(str(tmp_path / "full"))
+    full = analyzer.run_loader(source, newer[source], None, full_store, timezone)[0]
+    assert (full.records == analyzer.run_loader(source, newer[source], timezone=timezone)[0].records).all()
+
+    store = ScheduleStore(str(tmp_path / "incremental"))
+    first = analyzer.run_loader(source, older[source], None, store, timezone)[0]
+    first_mark, _ = store.load(source)
+    assert 0 < len(first) < len(full)
+    merged = analyzer.run_loader(source, newer[source], None, store, timezone)[0]
+    mark, stored = store.load(source)
+
+    assert (merged.records == full.records).all()
+    assert (stored.records == full.records).all()
+    assert first_mark < mark
+    assert mark == full_store.load(source)[0]
+
+    # the same export again changes nothing
+    assert (analyzer.run_loader(source, newer[source], None, store, timezone)[0].records == full.records).all()
+    assert store.load(source)[0] == mark
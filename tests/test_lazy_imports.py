@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('pandas', 'matplotlib', 'scipy', 'bs4', 'seaborn', 'pyarrow')
+
+
+def test_importing_analyzer_skips_heavy_modules():
+    # run in a fresh interpreter, since this one may already have imported them for other tests
+    code = ("import sys, analyzer; "
+            f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_importing_analyzer_is_quick():
+    # around 0.2 s here; the budget is generous so only a heavy module creeping back in at import time trips it
+    code = "import time; started = time.perf_counter(); import analyzer; print(time.perf_counter() - started)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert float(result.stdout) < 2.0
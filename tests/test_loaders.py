@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+import analyzer
+from applehealthanalyzer import AppleHealthAnalyzer
+from instrumentation import metrics
+from synthetic import write_apple_health, write_browser_history, write_youtube_history
+
+PRODUCTS = {'youtube': ('events',), 'chrome': ('events',), 'apple': ('events', 'intervals')}
+
+
+@pytest.fixture(scope="module")
+def paths(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("sources")
+    paths = {'youtube': str(directory / "watch-history.html"), 'chrome': str(directory / "BrowserHistory.json"),
+             'apple': str(directory / "export.xml")}
+    write_youtube_history(paths['youtube'], 100 * 1024, seed=1)
+    write_browser_history(paths['chrome'], 100 * 1024, seed=2)
+    write_apple_health(paths['apple'], 100 * 1024, seed=3)
+    return paths
+
+
+@pytest.fixture
+def counted():
+    metrics.enabled = True
+    metrics.reset()
+    yield metrics.counters
+    metrics.enabled = False
+    metrics.reset()
+
+
+def test_products_come_from_a_single_read(paths, counted):
+    schedules, found = analyzer.load_sources(paths, jobs=1, products=PRODUCTS)
+    for source, path in paths.items():
+        assert set(found[source]) == set(PRODUCTS[source])
+        assert len(schedules[source]) > 0
+    for source, path in paths.items():
+        assert counted[f'{source}.bytes_read'] == os.path.getsize(path)
+    # the youtube schedule places the stamps parsed for the events; the apple step and sleep records are read
+    # in one pass, which the schedule and the intervals both come from
+    assert metrics.calls['youtube.parse_stamps'] == 1
+    assert metrics.calls['apple.intervals'] == 1
+    assert metrics.calls['apple.activity'] == 1
+
+
+def test_apple_events_alone_read_the_export_once(paths, counted):
+    alone, _ = analyzer.load_sources({'apple': paths['apple']}, jobs=1)
+    metrics.reset()
+    schedules, found = analyzer.load_sources({'apple': paths['apple']}, jobs=1, products={'apple': ('events',)})
+    assert set(found['apple']) == {'events'}
+    assert (schedules['apple'].records == alone['apple'].records).all()
+    assert metrics.counters['apple.bytes_read'] == os.path.getsize(paths['apple'])
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_products_match_loading_them_separately(paths, jobs):
+    schedules, found = analyzer.load_sources(paths, jobs=jobs, products=PRODUCTS)
+    alone, nothing = analyzer.load_sources(paths, jobs=1)
+    assert list(schedules) == list(paths)
+    assert nothing == {source: {} for source in paths}
+    for source in paths:
+        assert (schedules[source].records == alone[source].records).all()
+
+    # the events on their own, without the apple intervals loaded alongside them
+    _, events = analyzer.load_sources(paths, jobs=1, products={source: ('events',) for source in paths})
+    for source in paths:
+        for loaded, expected in zip(found[source]['events'], events[source]['events']):
+            assert np.array_equal(loaded, expected)
+    intervals = AppleHealthAnalyzer(paths['apple']).load_intervals()
+    assert np.array_equal(found['apple']['intervals'].starts, intervals.starts)
+    assert np.array_equal(found['apple']['intervals'].stages, intervals.stages)
@@ -0,0 +1,50 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from resampling import bootstrap_ci, paired_permutation_test
+
+
+def _enumerated_p_value(first, second):
+    differences = np.asarray(first, dtype=float) - np.asarray(second, dtype=float)
+    observed = abs(differences.mean())
+    flips = [abs(np.dot(signs, differences)) / len(differences)
+             for signs in itertools.product((1, -1), repeat=len(differences))]
+    return sum(flip >= observed - 1e-9 for flip in flips) / len(flips)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_exact_sign_flip_p_value_matches_enumeration(seed):
+    rng = np.random.default_rng(seed)
+    first, second = rng.normal(0.3, 1, 10), rng.normal(0, 1, 10)
+    result = paired_permutation_test(first, second, resamples=2 ** 10)
+    assert result['exact']
+    assert result['resamples'] == 2 ** 10
+    assert result['p_value'] == pytest.approx(_enumerated_p_value(first, second))
+    assert result['mean_difference'] == pytest.approx(np.mean(first - second))
+
+
+def test_sampled_p_value_is_close_to_the_exact_one():
+    rng = np.random.default_rng(3)
+    first, second = rng.normal(0.3, 1, 14), rng.normal(0, 1, 14)
+    sampled = paired_permutation_test(first, second, resamples=5000, seed=1)
+    assert not sampled['exact']
+    assert sampled['p_value'] == pytest.approx(_enumerated_p_value(first, second), abs=0.03)
+
+
+def test_bootstrap_interval_is_reproducible_with_a_seed():
+    values = np.random.default_rng(4).normal(2, 1, 40)
+    first = bootstrap_ci(values, resamples=2000, seed=7)
+    assert bootstrap_ci(values, resamples=2000, seed=7) == first
+    assert bootstrap_ci(values, resamples=2000, seed=8) != first
+    assert first['estimate'] == pytest.approx(values.mean())
+    assert first['low'] < first['estimate'] < first['high']
+    # a median works too, since it takes an axis like the numpy reductions
+    median = bootstrap_ci(values, statistic=np.median, resamples=500, seed=7)
+    assert median['low'] <= np.median(values) <= median['high']
+
+
+def test_empty_samples_give_nan():
+    assert np.isnan(bootstrap_ci([])['estimate'])
+    assert np.isnan(paired_permutation_test([], [])['p_value'])
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from schedule import SECONDS_PER_DAY
+from sleepintervals import ASLEEP_STAGES, AWAKE, CORE, DEEP, IN_BED, REM, STAGES, SleepIntervals, merge_intervals
+
+
+def _union_length(spans):
+    covered = set()
+    for start, end in spans:
+        covered.update(range(start, end))
+    return len(covered)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merge_intervals_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    count, groups = 300, 7
+    starts = rng.integers(0, 500, count)
+    # some intervals are empty or end before they start; those cover nothing
+    ends = starts + rng.integers(-5, 60, count)
+    group = rng.integers(0, groups, count)
+    expected = [_union_length([(s, e) for s, e, g in zip(starts, ends, group) if g == number])
+                for number in range(groups)]
+    assert merge_intervals(starts, ends, group, groups).tolist() == expected
+    assert merge_intervals(starts[:0], ends[:0], group[:0], groups).tolist() == [0] * groups
+
+
+def _random_intervals(rng, count=400):
+    # records over a few nights from two sources, in minutes so the brute force stays small, with repeats
+    starts = rng.integers(0, 4 * SECONDS_PER_DAY // 60, count) * 60
+    ends = starts + rng.integers(1, 120, count) * 60
+    offsets = rng.choice([-5 * 3600, 0, 3600], count)
+    stages = rng.integers(-1, len(STAGES), count)
+    sources = rng.integers(0, 2, count)
+    repeats = rng.integers(0, count, count // 10)
+    pick = np.concatenate((np.arange(count), repeats))
+    return SleepIntervals(starts[pick], ends[pick], offsets[pick], offsets[pick] + 60, stages[pick], sources[pick],
+                          ['Watch', 'Phone'])
+
+
+def _brute_force_nights(intervals, anchor_hour):
+    # the first of each repeated (source, stage, start, end), in record order
+    unique = {}
+    for record in zip(intervals.sources.tolist(), intervals.stages.tolist(), intervals.starts.tolist(),
+                      intervals.ends.tolist(), intervals.offsets.tolist(), intervals.end_offsets.tolist()):
+        unique.setdefault(record[:4], record)
+    records = list(unique.values())
+    nights = {}
+    for record in records:
+        source, stage, start, end, offset, end_offset = record
+        nights.setdefault((start + offset - int(anchor_hour * 3600)) // SECONDS_PER_DAY, []).append(record)
+
+    expected = []
+    for window, night in sorted(nights.items()):
+        asleep = [record for record in night if record[1] in ASLEEP_STAGES]
+        in_bed = [record for record in night if record[1] == IN_BED]
+        if not asleep and not in_bed:
+            continue
+        counts = {}
+        for record in asleep:
+            counts[record[0]] = counts.get(record[0], 0) + 1
+        source = max(counts, key=lambda source: (counts[source], source)) if counts else -1
+        chosen = [record for record in night if record[0] == source]
+
+        def total(stages, pool=chosen):
+            return _union_length([(start, end) for _, stage, start, end, _, _ in pool if stage in stages])
+
+        bounds = [record for record in chosen if record[1] in ASLEEP_STAGES] or in_bed
+        onset = min(bounds, key=lambda record: record[2])
+        wake = max(enumerate(bounds), key=lambda item: (item[1][3], item[0]))[1]
+        expected.append((window, onset[2], wake[3], onset[4], wake[5], total(ASLEEP_STAGES),
+                         total((IN_BED,), night), total((AWAKE,)), total((CORE,)), total((DEEP,)), total((REM,)),
+                         source))
+    return expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("anchor_hour", [18, 12.5])
+def test_nights_match_brute_force(seed, anchor_hour):
+    intervals = _random_intervals(np.random.default_rng(seed))
+    nights = intervals.nights(anchor_hour).records
+    actual = [(int(record['date'].astype(np.int64)),) + tuple(int(record[field]) for field in nights.dtype.names[1:])
+              for record in nights]
+    assert actual == _brute_force_nights(intervals, anchor_hour)
@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from applehealthanalyzer import AppleHealthAnalyzer
+from instrumentation import metrics
+from sourcecache import SourceCache
+from synthetic import write_apple_health, write_youtube_history
+from youtubehistoryanalyzer import YoutubeHistoryAnalyzer
+
+
+def _churn(cache_dir, sources, worker):
+    # stores and loads entries under a limit small enough that every store evicts another process's entries
+    cache = SourceCache(cache_dir, max_bytes=4096)
+    rng = np.random.default_rng(worker)
+    for step in range(150):
+        source = sources[(worker + step) % len(sources)]
+        kind = f"kind{step % 5}"
+        cache.store(kind, source, values=rng.random(200))
+        cache.load(kind, source)
+    return True
+
+
+def test_concurrent_store_load_and_evict(tmp_path):
+    sources = []
+    for number in range(4):
+        source = tmp_path / f"export{number}.json"
+        source.write_text("{}")
+        sources.append(str(source))
+    cache_dir = str(tmp_path / "cache")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(_churn, cache_dir, sources, worker) for worker in range(4)]
+        assert all(future.result() for future in futures)
+
+
+def test_load_round_trip_and_fingerprint_miss(tmp_path):
+    source = tmp_path / "export.json"
+    source.write_text("{}")
+    cache = SourceCache(str(tmp_path / "cache"))
+    cache.store("chrome", str(source), time_usec=np.arange(5))
+    assert cache.load("chrome", str(source))["time_usec"].tolist() == [0, 1, 2, 3, 4]
+    source.write_text("{\"changed\": true}")
+    assert cache.load("chrome", str(source)) is None
+
+
+@pytest.fixture
+def timed_calls():
+    metrics.enabled = True
+    metrics.reset()
+    yield metrics.calls
+    metrics.enabled = False
+    metrics.reset()
+
+
+@pytest.mark.parametrize("timezone", [None, "Europe/Berlin"])
+def test_warm_youtube_run_skips_scanning_and_parsing(tmp_path, timed_calls, timezone):
+    path = str(tmp_path / "watch-history.html")
+    write_youtube_history(path, 100 * 1024, seed=4)
+    cache = SourceCache(str(tmp_path / "cache"))
+    # the entry written without a timezone serves every zone
+    cold = YoutubeHistoryAnalyzer(path, engine="mmap", cache=cache).analyze()
+    expected = YoutubeHistoryAnalyzer(path, engine="mmap", timezone=timezone).analyze()
+    assert timed_calls['youtube.parse_stamps'] == 2
+
+    warm = YoutubeHistoryAnalyzer(path, engine="mmap", cache=cache, timezone=timezone)
+    assert (warm.analyze().records == expected.records).all()
+    assert timed_calls['youtube.parse'] == 2
+    assert timed_calls['youtube.parse_stamps'] == 2
+    if timezone is None:
+        assert (cold.records == expected.records).all()
+
+
+def test_warm_apple_run_matches_a_cold_one(tmp_path):
+    path = str(tmp_path / "export.xml")
+    write_apple_health(path, 100 * 1024, seed=4)
+    cache = SourceCache(str(tmp_path / "cache"))
+    cold = AppleHealthAnalyzer(path, streaming=True, cache=cache)
+    cold_schedule = cold.analyze()
+    warm = AppleHealthAnalyzer(path, streaming=True, cache=cache)
+    assert (warm.analyze().records == cold_schedule.records).all()
+    assert {date: (start.isoformat(), end.isoformat()) for date, (start, end) in warm.schedule.items()} == \
+        {date: (start.isoformat(), end.isoformat()) for date, (start, end) in cold.schedule.items()}
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from tzoffsets import OffsetTable
+from youtubehistoryanalyzer import YoutubeHistoryAnalyzer
+
+EDT_STAMP = "Aug 1, 2025, 9:03:20 PM EDT"
+EDT_UTC = int(datetime(2025, 8, 2, 1, 3, 20, tzinfo=timezone.utc).timestamp())
+
+
+def test_known_abbreviation_without_timezone():
+    local, times = YoutubeHistoryAnalyzer("unused").parse_stamps([EDT_STAMP])
+    assert times.tolist() == [EDT_UTC]
+    assert (local - times).tolist() == [-4 * 3600]
+
+
+def test_known_abbreviation_is_moved_into_timezone():
+    local, times = YoutubeHistoryAnalyzer("unused", timezone="Europe/Berlin").parse_stamps([EDT_STAMP])
+    assert times.tolist() == [EDT_UTC]
+    assert (local - times).tolist() == [2 * 3600]
+
+
+def test_unknown_abbreviation_is_read_in_timezone():
+    local, times = YoutubeHistoryAnalyzer("unused", timezone="Europe/Berlin").parse_stamps(
+        ["Aug 1, 2025, 9:03:20 PM XYZ"])
+    assert times.tolist() == [int(datetime(2025, 8, 1, 19, 3, 20, tzinfo=timezone.utc).timestamp())]
+
+
+def test_daily_schedule_dates_follow_timezone():
+    analyzer = YoutubeHistoryAnalyzer("unused", timezone="Europe/Berlin")
+    schedule = analyzer.process_daily_timestamps(stamps=[EDT_STAMP])
+    assert schedule.dates.tolist() == [np.datetime64('2025-08-02', 'D').item()]
+    assert schedule.records['start'].tolist() == [EDT_UTC]
+
+
+def test_travel_schedule_offsets():
+    table = OffsetTable.from_schedule([("2024-01-01", "US/Eastern"), ("2024-06-01", "Europe/Berlin")])
+    winter = int(datetime(2024, 2, 1, tzinfo=timezone.utc).timestamp())
+    summer = int(datetime(2024, 7, 1, tzinfo=timezone.utc).timestamp())
+    assert table.offsets_at([winter, summer]).tolist() == [-5 * 3600, 2 * 3600]
+    assert table.utc(table.local([winter, summer])).tolist() == [winter, summer]
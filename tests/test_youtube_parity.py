@@ -0,0 +1,47 @@
+import pytest
+
+from synthetic import write_youtube_history
+from youtubehistoryanalyzer import YoutubeHistoryAnalyzer, extract_stamps, iter_stamps_mmap, scan_stamps_mmap
+
+
+@pytest.fixture(scope="module")
+def history(tmp_path_factory):
+    path = tmp_path_factory.mktemp("youtube") / "watch-history.html"
+    write_youtube_history(str(path), 200 * 1024, seed=3)
+    with open(path, encoding="utf-8") as file:
+        text = file.read()
+    return str(path), text, extract_stamps(text)
+
+
+def test_history_has_stamps(history):
+    _, _, reference = history
+    assert len(reference) > 100
+
+
+def test_mmap_scan_matches_soup(history):
+    path, _, reference = history
+    assert scan_stamps_mmap(path) == reference
+    assert list(iter_stamps_mmap(path)) == reference
+
+
+def test_chunks_split_inside_a_stamp_match_soup(history):
+    path, text, reference = history
+    # a read size that ends in the middle of a stamp's text, so the chunker has to carry it over; in the file
+    # the meridiem is preceded by a narrow no-break space, which extraction turns into a plain one
+    raw_stamp = reference[49].replace(' AM ', '\u202fAM ').replace(' PM ', '\u202fPM ')
+    stamp_start = text.index(raw_stamp)
+    analyzer = YoutubeHistoryAnalyzer(path, jobs=1)
+    analyzer.BUFFER_SIZE = stamp_start + 5
+    chunks = list(analyzer.iter_chunks())
+    assert len(chunks) > 1
+    assert ''.join(chunks) == text
+    assert [stamp for chunk in chunks for stamp in extract_stamps(chunk)] == reference
+
+
+@pytest.mark.parametrize("engine,jobs", [("soup", 1), ("soup", 2), ("mmap", 1)])
+def test_engines_collect_the_same_stamps(history, engine, jobs):
+    path, _, reference = history
+    analyzer = YoutubeHistoryAnalyzer(path, jobs=jobs, engine=engine)
+    analyzer.BUFFER_SIZE = 4096
+    analyzer.process_html_file()
+    assert analyzer.stamps == reference
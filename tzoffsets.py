@@ -0,0 +1,135 @@
+import csv
+import functools
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+import pytz
+
+# utc offsets as a table of transitions, so converting any number of timestamps is one searchsorted instead of a
+# tz lookup per timestamp. pytz keeps each zone's transitions (through 2037; the last offset holds after that)
+# in _utc_transition_times/_transition_info, which is what the tables are built from
+
+TimeSpec = Union[int, float, str, date, datetime]
+ZoneSpec = Union[str, "OffsetTable"]
+
+# earliest transition; every table starts here so any instant has an offset
+BEGINNING = np.iinfo(np.int64).min
+
+
+def _epoch_seconds(when: TimeSpec) -> int:
+    # epoch seconds, a datetime or an ISO date/datetime string; naive values are taken as UTC
+    if isinstance(when, (int, float, np.integer)):
+        return int(when)
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    if not isinstance(when, datetime):
+        when = datetime(when.year, when.month, when.day)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int(when.timestamp())
+
+
+class OffsetTable:
+    # transitions: epoch seconds (ascending) from which offsets[i] (seconds east of UTC) is in effect
+    __slots__ = ('transitions', 'offsets', 'name', '_bounds', '_tzinfos')
+
+    def __init__(self, transitions, offsets, name: str = ''):
+        self.transitions = np.array(transitions, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.transitions[0] = BEGINNING
+        self.name = name
+        # python-side copies for converting one timestamp at a time
+        self._bounds = self.transitions.tolist()
+        self._tzinfos = [timezone(timedelta(seconds=offset)) for offset in self.offsets.tolist()]
+
+    @classmethod
+    def from_zone(cls, zone: str) -> "OffsetTable":
+        return _zone_table(zone)
+
+    @classmethod
+    def from_schedule(cls, periods: Iterable[Tuple[TimeSpec, str]]) -> "OffsetTable":
+        # a travel schedule: (start, zone) pairs, each zone in effect from its start until the next one's; the
+        # first zone also covers everything before its start
+        periods = sorted((_epoch_seconds(start), zone) for start, zone in periods)
+        if not periods:
+            raise ValueError("a travel schedule needs at least one (start, zone) period")
+        transitions: List[np.ndarray] = []
+        offsets: List[np.ndarray] = []
+        for number, (start, zone) in enumerate(periods):
+            table = _zone_table(zone)
+            start = BEGINNING if number == 0 else start
+            end = periods[number + 1][0] if number + 1 < len(periods) else None
+            # the transition in effect at `start`, moved up to it, then every later one before `end`
+            first = np.searchsorted(table.transitions, start, side='right') - 1
+            last = len(table.transitions) if end is None else np.searchsorted(table.transitions, end, side='left')
+            transitions.append(np.concatenate(([start], table.transitions[first + 1:last])))
+            offsets.append(table.offsets[first:max(last, first + 1)])
+        return cls(np.concatenate(transitions), np.concatenate(offsets),
+                   ', '.join(f"{zone} from {datetime.fromtimestamp(start, timezone.utc).date()}"
+                             for start, zone in periods))
+
+    def __len__(self) -> int:
+        return len(self.transitions)
+
+    def __repr__(self) -> str:
+        return f"OffsetTable({self.name or 'custom'}, {len(self)} transitions)"
+
+    def __reduce__(self):
+        # the python-side copies are rebuilt rather than pickled when a table is sent to a worker
+        return OffsetTable, (self.transitions, self.offsets, self.name)
+
+    def offsets_at(self, times) -> np.ndarray:
+        # utc offset in effect at each of the epoch seconds `times`
+        index = np.searchsorted(self.transitions, np.asarray(times, dtype=np.int64), side='right') - 1
+        return self.offsets[index]
+
+    def local(self, times) -> np.ndarray:
+        # local wall-clock seconds (epoch seconds shifted by the offset) of the epoch seconds `times`
+        times = np.asarray(times, dtype=np.int64)
+        return times + self.offsets_at(times)
+
+    def utc(self, local) -> np.ndarray:
+        # epoch seconds of local wall-clock seconds; a repeated hour (DST ending) is taken as its first
+        # occurrence and a skipped hour (DST starting) is shifted forward by the gap
+        local = np.asarray(local, dtype=np.int64)
+        guess = self.offsets_at(local - self.offsets_at(local))
+        return local - self.offsets_at(local - guess)
+
+    def offset_at(self, seconds: int) -> int:
+        return int(self.offsets[bisect_right(self._bounds, seconds) - 1])
+
+    def datetime_at(self, seconds: float) -> datetime:
+        # aware datetime (with a fixed-offset tzinfo) of one timestamp, for code that works per record
+        tzinfo = self._tzinfos[bisect_right(self._bounds, seconds) - 1]
+        return datetime.fromtimestamp(seconds, tzinfo)
+
+
+@functools.lru_cache(maxsize=None)
+def _zone_table(zone: str) -> OffsetTable:
+    tz = pytz.timezone(zone)
+    transition_times = getattr(tz, '_utc_transition_times', None)
+    if not transition_times:
+        # fixed-offset zones (UTC, EST, Etc/GMT+5, ...) have no transitions
+        return OffsetTable([BEGINNING], [int(tz.utcoffset(datetime(2000, 1, 1)).total_seconds())], zone)
+    transitions = np.array(transition_times, dtype='datetime64[s]').astype(np.int64)
+    offsets = [int(utcoffset.total_seconds()) for utcoffset, _, _ in tz._transition_info]
+    return OffsetTable(transitions, offsets, zone)
+
+
+def offset_table(zone: ZoneSpec) -> OffsetTable:
+    # a zone name or a table; tables for zone names are built once per process
+    if isinstance(zone, OffsetTable):
+        return zone
+    return _zone_table(zone)
+
+
+def read_travel_schedule(path: str) -> OffsetTable:
+    # CSV with start,timezone columns, e.g. "2024-06-01,Europe/Berlin"
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    missing = [number for number, row in enumerate(rows, start=1) if not row.get('start') or not row.get('timezone')]
+    if missing:
+        raise ValueError(f"{path}: rows {', '.join(map(str, missing))} need a start and a timezone")
+    return OffsetTable.from_schedule((row['start'], row['timezone']) for row in rows)
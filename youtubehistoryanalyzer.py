@@ -1,29 +1,104 @@
-from collections import defaultdict
+import calendar
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import html
+import mmap
+import os
 
-from bs4 import BeautifulSoup
 from io import StringIO
+import numpy as np
 import re
 
+from instrumentation import metrics, timed
+from schedule import SECONDS_PER_DAY, DailySchedule
+from tzoffsets import ZoneSpec, offset_table
+
+# every watch entry in a Takeout watch-history.html starts with one of these, so chunks are only cut here
+RECORD_MARKER = '<div class="outer-cell'
+CONTENT_CELL = b'<div class="content-cell mdl-cell mdl-cell--6-col mdl-typography--body-1">'
+ENGINES = ('soup', 'mmap')
+# Takeout appends the viewer's zone abbreviation to each stamp; unknown zones fall back to UTC, which keeps
+# the wall-clock time intact. With a timezone (or travel schedule) stamps with a known abbreviation are moved
+# into that zone, and only the others are read as wall-clock times of it
+ZONE_OFFSETS = {
+    'UTC': 0, 'GMT': 0, 'BST': 3600, 'CET': 3600, 'CEST': 7200,
+    'EST': -5 * 3600, 'EDT': -4 * 3600, 'CST': -6 * 3600, 'CDT': -5 * 3600,
+    'MST': -7 * 3600, 'MDT': -6 * 3600, 'PST': -8 * 3600, 'PDT': -7 * 3600,
+    'AKST': -9 * 3600, 'AKDT': -8 * 3600, 'HST': -10 * 3600,
+}
+# furthest any zone is behind UTC; a wall-clock time at or before since + this is older than `since` in any zone
+MIN_UTC_OFFSET = -12 * 3600
+CUTOFF_LOCAL = calendar.timegm(datetime(2025, 1, 1).timetuple())
+
+
+def extract_stamps(buffer):
+    # BeautifulSoup is only needed by the 'soup' engine, so it isn't imported until a chunk is parsed
+    from bs4 import BeautifulSoup
+
+    stamps = []
+    with StringIO(buffer) as buffer_io:
+        soup = BeautifulSoup(buffer_io, 'lxml')
+        content_cells = soup.find_all('div', class_='content-cell mdl-cell mdl-cell--6-col mdl-typography--body-1')
+        for cell in content_cells:
+            timestamp = cell.contents[len(cell.contents) - 1].text
+            if not str(timestamp).startswith("<a"):
+                stamps.append(str(timestamp).replace('\u202f', ' '))
+    return stamps
+
+
+def scan_stamps_mmap(filepath):
+    return list(iter_stamps_mmap(filepath))
+
+
+def iter_stamps_mmap(filepath):
+    # DOM-free equivalent of extract_stamps over the whole file: for each content cell, the stamp is the
+    # trailing text after its last tag, which is what BeautifulSoup reports as the cell's last child
+    with open(filepath, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            find = data.find
+            rfind = data.rfind
+            cell_len = len(CONTENT_CELL)
+            pos = find(CONTENT_CELL)
+            while pos != -1:
+                body = pos + cell_len
+                end = find(b'</div>', body)
+                if end == -1:
+                    break
+                text_start = max(rfind(b'>', body, end) + 1, body)
+                if text_start < end:
+                    timestamp = data[text_start:end].decode('utf-8')
+                    if '&' in timestamp:
+                        timestamp = html.unescape(timestamp)
+                    yield timestamp.replace('\u202f', ' ')
+                pos = find(CONTENT_CELL, end)
+
 
 class YoutubeHistoryAnalyzer:
-    def __init__(self, filepath):
+    def __init__(self, filepath, jobs=None, engine='soup', cache=None, timezone: ZoneSpec = None):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
         self.BUFFER_SIZE = 1024 * 1024
         self.date_time_pattern = re.compile(r'\b\w+\s\d{1,2},\s\d{4},\s\d{1,2}:\d{2}:\d{2}\s\w+\s\w+\b')
         self.stamps = []
         self.filepath = filepath
-        self.schedules = {}
+        self.jobs = jobs or os.cpu_count() or 1
+        self.engine = engine
+        self.cache = cache
+        self.timezone = None if timezone is None else offset_table(timezone)
+        # (wall clock, zone offsets, known) of every stamp, once wall_clock has read them
+        self._wall_clock = None
+        self.schedules = DailySchedule()
+        # epoch seconds of the latest watch stamp analyzed, for incremental runs
+        self.high_water_mark = None
 
     def process_buffer(self, buffer):
-        with StringIO(buffer) as buffer_io:
-            soup = BeautifulSoup(buffer_io, 'lxml')
-            content_cells = soup.find_all('div', class_='content-cell mdl-cell mdl-cell--6-col mdl-typography--body-1')
-            for cell in content_cells:
-                timestamp = cell.contents[len(cell.contents) - 1].text
-                if not str(timestamp).startswith("<a"):
-                    self.stamps.append(str(timestamp).replace('\u202f', ' '))
+        self.stamps.extend(extract_stamps(buffer))
 
-    def process_html_file(self):
+    def iter_chunks(self):
+        # yields ~BUFFER_SIZE pieces of the file, each ending right before a record marker so no record is split
         with open(self.filepath, 'r', encoding='utf-8') as file:
             buffer = ''
             while True:
@@ -31,41 +106,160 @@ class YoutubeHistoryAnalyzer:
                 if not chunk:
                     break
                 buffer += chunk
-                self.process_buffer(buffer)
-                buffer = ''
+                cut = buffer.rfind(RECORD_MARKER, 1)
+                if cut > 0:
+                    yield buffer[:cut]
+                    buffer = buffer[cut:]
+            if buffer:
+                yield buffer
 
-    def process_daily_timestamps(self):
-        grouped_by_date = defaultdict(list)
-        for timestamp in self.stamps:
-            timestamp_no_tz = timestamp.rsplit(' ', 1)[0]
+    def process_html_file(self):
+        seen = len(self.stamps)
+        with metrics.timer('youtube.parse'):
+            self._process_html_file()
+        metrics.count('youtube.records_seen', len(self.stamps) - seen)
+        metrics.count('youtube.bytes_read', os.path.getsize(self.filepath))
+
+    def _process_html_file(self):
+        if self.engine == 'mmap':
+            self.stamps.extend(scan_stamps_mmap(self.filepath))
+            return
+
+        if self.jobs <= 1:
+            for chunk in self.iter_chunks():
+                self.process_buffer(chunk)
+            return
+
+        # chunks are submitted in file order and collected in the same order, so the result is deterministic;
+        # at most 2 * jobs chunks are in flight to keep memory bounded
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            pending = deque()
+            for chunk in self.iter_chunks():
+                pending.append(executor.submit(extract_stamps, chunk))
+                if len(pending) >= 2 * self.jobs:
+                    self.stamps.extend(pending.popleft().result())
+            while pending:
+                self.stamps.extend(pending.popleft().result())
+
+    def _load_cached_wall_clock(self):
+        # the parsed stamps (see parse_wall_clock), so a warm run neither scans nor parses; the entry doesn't
+        # depend on self.timezone, which is only applied when the stamps are placed
+        if self.cache is None:
+            return None
+        cached = self.cache.load('youtube-times', self.filepath)
+        if cached is None:
+            return None
+        return cached['wall_clock'], cached['zone_offsets'], cached['known']
+
+    def _store_cached_wall_clock(self, wall_clock, zone_offsets, known):
+        if self.cache is not None:
+            self.cache.store('youtube-times', self.filepath, wall_clock=wall_clock, zone_offsets=zone_offsets,
+                             known=known)
+
+    def wall_clock(self):
+        # parse_wall_clock of every stamp in the history, from the cache or from a scan (unless one already ran);
+        # kept on the analyzer, so event_times and analyze parse the stamps once between them
+        if self._wall_clock is None:
+            parsed = self._load_cached_wall_clock()
+            if parsed is None:
+                if not self.stamps:
+                    self.process_html_file()
+                parsed = self.parse_wall_clock(self.stamps)
+                self._store_cached_wall_clock(*parsed)
+            self._wall_clock = parsed
+        return self._wall_clock
+
+    @timed('youtube.parse_stamps')
+    def parse_wall_clock(self, stamps, since=None):
+        # wall-clock epoch seconds of the stamps that parse, the utc offsets of their zone abbreviations (0 when
+        # unknown) and which abbreviations were known. Watch history is newest first, so with `since` (epoch
+        # seconds) reading stops at the first stamp that can't be newer
+        dts = []
+        zone_offsets = []
+        known = []
+        fallback = 0 if self.timezone is None else MIN_UTC_OFFSET
+        for timestamp in stamps:
+            timestamp_no_tz, _, zone = timestamp.rpartition(' ')
             try:
                 dt = datetime.strptime(timestamp_no_tz, '%b %d, %Y, %I:%M:%S %p')
             except ValueError:
                 continue
-            date_str = dt.strftime('%Y-%m-%d')
-            time_str = dt.strftime('%I:%M:%S %p')
-            if dt > datetime.strptime("01 01, 2025, 12:00:00 AM", '%m %d, %Y, %I:%M:%S %p'):
-                grouped_by_date[date_str].append(time_str)
+            offset = ZONE_OFFSETS.get(zone)
+            if since is not None and calendar.timegm(dt.timetuple()) - (fallback if offset is None else offset) <= since:
+                break
+            dts.append(dt)
+            zone_offsets.append(offset or 0)
+            known.append(offset is not None)
+        return (np.array(dts, dtype='datetime64[s]').astype(np.int64), np.array(zone_offsets, dtype=np.int32),
+                np.array(known, dtype=bool))
+
+    def place(self, wall_clock, zone_offsets, known, since=None):
+        # local wall-clock seconds (in self.timezone, if set) and utc epoch seconds of parsed stamps; without a
+        # timezone unknown zones are read as UTC
+        times = wall_clock - zone_offsets.astype(np.int64)
+        local = wall_clock
+        if self.timezone is not None:
+            times = np.where(known, times, self.timezone.utc(wall_clock))
+            local = self.timezone.local(times)
+        if since is not None:
+            newer = times > since
+            local, times = local[newer], times[newer]
+        return local, times
 
-        result = {}
+    def parse_stamps(self, stamps, since=None):
+        # local and utc epoch seconds of the stamps that parse, as place() puts them
+        return self.place(*self.parse_wall_clock(stamps, since), since)
 
-        for date, ts_list in grouped_by_date.items():
-            sorted_ts_list = sorted(ts_list, key=lambda x: datetime.strptime(x, '%I:%M:%S %p'))
-            earliest = sorted_ts_list[0]
-            latest = sorted_ts_list[-1]
-            result[date] = (earliest, latest)
+    def process_daily_timestamps(self, since=None, stamps=None):
+        # earliest and latest watch stamp per local date (by wall-clock time); with `since` (epoch seconds)
+        # only newer stamps are looked at
+        if stamps is None:
+            stamps = self.stamps
+        return self.daily_schedule(*self.parse_stamps(stamps, since), since)
 
-        sorted_result = sorted(result.items())
-        self.schedules = sorted_result
+    @timed('youtube.daily_schedule')
+    def daily_schedule(self, local, times, since=None):
+        # process_daily_timestamps for stamps already placed
+        kept = local > CUTOFF_LOCAL
+        local, times = local[kept], times[kept]
+        metrics.count('youtube.records_kept', len(local))
+        if not len(local):
+            self.schedules = DailySchedule()
+            self.high_water_mark = since
+            return self.schedules
+
+        # sorted by date then wall-clock time (stable, so equal stamps keep their order), the first and last
+        # entry of each date are its bounds
+        days = local // SECONDS_PER_DAY
+        order = np.lexsort((local, days))
+        sorted_days = days[order]
+        edges = np.concatenate(([True], sorted_days[1:] != sorted_days[:-1]))
+        earliest = order[edges]
+        latest = order[np.append(edges[1:], True)]
+        self.schedules = DailySchedule.from_arrays(
+            days[earliest].astype('datetime64[D]'),
+            times[earliest],
+            times[latest],
+            local[earliest] - times[earliest],
+            local[latest] - times[latest],
+        )
+        ends = self.schedules.records['end']
+        self.high_water_mark = since
+        if len(ends) and (since is None or ends.max() > since):
+            self.high_water_mark = int(ends.max())
         return self.schedules
+    def event_times(self):
+        # epoch seconds and utc offsets of every watch stamp, for an activity timeline
+        local, times = self.place(*self.wall_clock())
+        return times, (local - times).astype(np.int32)
+
     def normalize_for_analysis(self):
-        ret = {}
-        for schedule in self.schedules:
-            new1 = schedule[1][0][:5] + schedule[1][0][8:]
-            new2 = schedule[1][1][:5] + schedule[1][1][8:]
-            ret[schedule[0]] = (new1,new2)
-        return ret
-    def analyze(self):
-        self.process_html_file()
-        self.process_daily_timestamps()
-        return self.normalize_for_analysis()
+        return self.schedules.to_dict()
+    def analyze(self, since=None):
+        # since: an earlier run's high_water_mark; only newer stamps are analyzed
+        if since is not None and self.engine == 'mmap' and self._wall_clock is None and not self.stamps:
+            self._wall_clock = self._load_cached_wall_clock()
+            if self._wall_clock is None:
+                # the scan is lazy here, so it ends together with processing at the mark
+                return self.process_daily_timestamps(since, iter_stamps_mmap(self.filepath))
+        return self.daily_schedule(*self.place(*self.wall_clock(), since), since)